@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Profile, ExternalAccount, Guild, Membership, Event, EventTemplate, RSVP
+from .models import Profile, ExternalAccount, Guild, Membership, Event, EventSeries, EventTemplate, RSVP
+from .avatars import replace_avatar
   
 
 class ExternalAccountInline(admin.TabularInline):
@@ -11,11 +12,20 @@ class ProfileAdmin(admin.ModelAdmin):
     list_display = ('display_name', 'user', 'status', 'created_at')
     inlines = [ExternalAccountInline]
     
-    fields = ('user', 'display_name', 'rank', 'main_game', 'preferred_roles', 'status')
+    fields = ('user', 'display_name', 'avatar', 'rank', 'main_game', 'preferred_roles', 'status')
+
+    def save_model(self, request, obj, form, change):
+        # Avatar files are shared and reference-counted, as on the profile page.
+        avatar_changed = 'avatar' in form.changed_data
+        old_avatar = Profile.objects.filter(pk=obj.pk).values_list('avatar', flat=True).first() if change and avatar_changed else None
+        super().save_model(request, obj, form, change)
+        if avatar_changed:
+            replace_avatar(obj, old_avatar)
     
 # keep registering the rest as before:
 admin.site.register(Guild)
 admin.site.register(Membership)
 admin.site.register(Event)
+admin.site.register(EventSeries)
 admin.site.register(EventTemplate)
 admin.site.register(RSVP)
\ No newline at end of file
@@ -0,0 +1,20 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from .instrumentation import instrument_connections
+
+
+def _in_own_thread(func):
+    def run():
+        instrument_connections()
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    # thread_sensitive=False gives each callable its own worker thread and
+    # therefore its own database connection, so the queries really overlap.
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def parallel(*funcs):
+    return await asyncio.gather(*(_in_own_thread(func)() for func in funcs))
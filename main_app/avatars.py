@@ -0,0 +1,157 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .models import Profile, StoredFile
+from .caching import forget_viewer
+
+logger = logging.getLogger(__name__)
+
+MAX_DIMENSION = getattr(settings, 'AVATAR_MAX_DIMENSION', 1024)
+VARIANT_SIZES = getattr(settings, 'AVATAR_VARIANT_SIZES', (48, 128, 256))
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'AVATAR_WORKERS', 2),
+    thread_name_prefix='avatars',
+)
+
+
+def variant_name(name, size, ext):
+    root, _ = posixpath.splitext(name)
+    return f'{root}_{size}.{ext}'
+
+
+def variant_names(name):
+    return [variant_name(name, size, ext) for size in VARIANT_SIZES for ext in VARIANT_FORMATS]
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == 'JPEG':
+        image = image.convert('RGB')
+        image.save(buffer, fmt, quality=85, optimize=True, progressive=True)
+    elif fmt == 'WEBP':
+        image.save(buffer, fmt, quality=80, method=4)
+    else:
+        image.save(buffer, fmt, optimize=True)
+    return buffer.getvalue()
+
+
+def render_avatar(raw):
+    # Re-encoding drops EXIF/ICC/text chunks; exif_transpose first so the
+    # orientation they carried is baked into the pixels.
+    with Image.open(BytesIO(raw)) as source:
+        fmt = source.format if source.format in ('JPEG', 'PNG', 'WEBP') else 'PNG'
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    if fmt == 'JPEG':
+        image = image.convert('RGB')
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+
+    variants = {}
+    for size in VARIANT_SIZES:
+        thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        for ext, variant_fmt in VARIANT_FORMATS.items():
+            variants[(size, ext)] = _encode(thumb, variant_fmt)
+    return _encode(image, fmt), fmt, variants
+
+
+def acquire_avatar(name):
+    if StoredFile.objects.filter(name=name).update(refs=F('refs') + 1):
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, refs=1)
+    except IntegrityError:
+        StoredFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release_avatar(storage, name):
+    if not name:
+        return
+    with transaction.atomic():
+        stored = StoredFile.objects.select_for_update().filter(name=name).first()
+        if stored is not None and stored.refs > 1:
+            StoredFile.objects.filter(pk=stored.pk).update(refs=F('refs') - 1)
+            return
+        if stored is not None:
+            stored.delete()
+
+        def delete_if_unreferenced():
+            # Another upload of the same content may have claimed it meanwhile.
+            if not StoredFile.objects.filter(name=name).exists():
+                delete_avatar_files(storage, name)
+        transaction.on_commit(delete_if_unreferenced)
+
+
+def process_avatar(storage, profile_pk, name):
+    try:
+        with storage.open(name, 'rb') as fh:
+            raw = fh.read()
+        try:
+            original, fmt, variants = render_avatar(raw)
+        except (UnidentifiedImageError, OSError):
+            logger.warning('Could not process avatar %s', name)
+            return
+        upload_to = Profile._meta.get_field('avatar').upload_to
+        # Named for what was written, not what was uploaded, so it is
+        # served with the right Content-Type.
+        stem = posixpath.splitext(posixpath.basename(name))[0]
+        path = posixpath.join(upload_to, f'{stem}.{FORMAT_EXTENSIONS[fmt]}')
+        written = []
+        try:
+            processed = storage.content_name(path, ContentFile(original))
+            if not storage.exists(processed):
+                written.append(processed)
+            storage.save(path, ContentFile(original))
+            for (size, ext), data in variants.items():
+                target = variant_name(processed, size, ext)
+                if not storage.exists(target):
+                    written.append(target)
+                storage.save_derived(target, ContentFile(data))
+        except Exception:
+            # Nothing refers to the new files yet; leave no partial set behind.
+            for target in written:
+                storage.delete(target)
+            raise
+        if processed != name:
+            acquire_avatar(processed)
+            swapped = Profile.objects.filter(pk=profile_pk, avatar=name).update(avatar=processed, updated_at=timezone.now())
+            release_avatar(storage, name if swapped else processed)
+            if swapped:
+                # update() skips the signals that drop the cached viewer.
+                forget_viewer(*Profile.objects.filter(pk=profile_pk).values_list('user_id', flat=True))
+    except Exception:
+        logger.exception('Avatar processing failed for %s', name)
+    finally:
+        close_old_connections()
+
+
+def replace_avatar(profile, old_name):
+    # After saving a profile whose avatar changed from old_name. The new
+    # reference is taken before the old one is dropped, in case both point
+    # at the same content-addressed file.
+    if profile.avatar:
+        schedule_avatar_processing(profile)
+    release_avatar(profile.avatar.storage, old_name)
+
+
+def schedule_avatar_processing(profile):
+    storage, name = profile.avatar.storage, profile.avatar.name
+    acquire_avatar(name)
+    transaction.on_commit(lambda: _executor.submit(process_avatar, storage, profile.pk, name))
+
+
+def delete_avatar_files(storage, name):
+    if not name:
+        return
+    for target in [name, *variant_names(name)]:
+        storage.delete(target)
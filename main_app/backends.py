@@ -0,0 +1,31 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db import DEFAULT_DB_ALIAS
+from .caching import cache_viewer, cached_viewer
+
+
+class CachedModelBackend(ModelBackend):
+    # Resolves the session's user, with its Profile joined in, from the
+    # cache, so an authenticated request needs no query for either. Entries
+    # are dropped whenever the User or Profile changes (see signals). A
+    # per-process cache could not drop them in the other workers, so without
+    # a shared one the user is always read from the database.
+    def get_user(self, user_id):
+        user = cached_viewer(user_id) if settings.SHARED_CACHE else None
+        if user is None:
+            users = get_user_model()._default_manager.select_related('profile')
+            if settings.SHARED_CACHE:
+                # The refill comes from the primary: a replica may still be
+                # behind the write that dropped the entry (see primary_reads).
+                users = users.using(DEFAULT_DB_ALIAS)
+            user = users.filter(pk=user_id).first()
+            if user is None:
+                return None
+            if settings.SHARED_CACHE:
+                cache_viewer(user)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
@@ -0,0 +1,83 @@
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+FRAGMENT_TTL = getattr(settings, 'GUILD_FRAGMENT_TTL', 60 * 60)
+
+
+def _new_version():
+    # Seeded from the clock rather than 1, so a version lost to eviction or a
+    # restart comes back higher than any it had before and can never reuse
+    # an old fragment key or ETag.
+    return time.time_ns()
+
+
+def _guild_key(guild_id):
+    return f'guild:{guild_id}:version'
+
+
+def guild_cache_version(guild_id):
+    return cache.get_or_set(_guild_key(guild_id), _new_version, None)
+
+
+def bump_guild_cache(*guild_ids):
+    for guild_id in set(guild_ids):
+        try:
+            cache.incr(_guild_key(guild_id))
+        except ValueError:
+            cache.add(_guild_key(guild_id), _new_version(), None)
+
+
+def guild_cache_versions(guild_ids):
+    keys = {_guild_key(guild_id): guild_id for guild_id in guild_ids}
+    return {keys[key]: version for key, version in cache.get_many(keys).items()}
+
+
+def _profile_key(profile_id):
+    return f'profile:{profile_id}:version'
+
+
+def profile_cache_version(profile_id):
+    return cache.get_or_set(_profile_key(profile_id), _new_version, None)
+
+
+def bump_profile_cache(profile_id):
+    try:
+        cache.incr(_profile_key(profile_id))
+    except ValueError:
+        cache.add(_profile_key(profile_id), _new_version(), None)
+
+
+VIEWER_TTL = getattr(settings, 'VIEWER_CACHE_TTL', 15 * 60)
+
+
+def _viewer_key(user_id):
+    return f'viewer:{user_id}'
+
+
+def cached_viewer(user_id):
+    entry = cache.get(_viewer_key(user_id))
+    if entry is None:
+        return None
+    fields, session_hash, profile = entry
+    model = get_user_model()
+    # The password stays deferred: reading it costs a query, and saving
+    # this instance leaves it alone.
+    user = model.from_db(DEFAULT_DB_ALIAS, list(fields), list(fields.values()))
+    user.get_session_auth_hash = lambda: session_hash
+    model.profile.related.set_cached_value(user, profile)
+    return user
+
+
+def cache_viewer(user):
+    # Everything but the password hash. Django checks sessions against the
+    # HMAC derived from it, so that is kept instead.
+    fields = {f.attname: getattr(user, f.attname) for f in user._meta.concrete_fields if f.attname != 'password'}
+    profile = type(user).profile.related.get_cached_value(user, default=None)
+    cache.set(_viewer_key(user.pk), (fields, user.get_session_auth_hash(), profile), VIEWER_TTL)
+
+
+def forget_viewer(*user_ids):
+    cache.delete_many([_viewer_key(user_id) for user_id in user_ids])
@@ -0,0 +1,80 @@
+from django.db.models import Exists, F, Q, Subquery
+from django.utils import timezone
+from .models import Event, RSVP
+from .tallies import COUNTER_FIELDS, shift_counters
+
+
+def claim_seat(event_id, old):
+    # A conditional UPDATE: the database checks the cap and moves the
+    # counters in one statement, holding only this event's row lock, so two
+    # racing signups can never both take the last seat.
+    changes = {'count_yes': F('count_yes') + 1}
+    if old in COUNTER_FIELDS and old != 'YES':
+        changes[COUNTER_FIELDS[old]] = F(COUNTER_FIELDS[old]) - 1
+    has_room = Q(max_participants__isnull=True) | Q(count_yes__lt=F('max_participants'))
+    return Event.objects.filter(has_room, pk=event_id).update(**changes) == 1
+
+
+def apply_response(rsvp, previous):
+    # Saves the answer set on rsvp (previously `previous`), turning a YES on
+    # a full event into a place at the back of the waitlist. Call inside a
+    # transaction holding the event's row lock, then the RSVP's.
+    response = rsvp.response
+    asked_again = response == 'YES' and previous == RSVP.RESPONSE_WAITLIST
+    if response == 'YES' and previous != 'YES':
+        if asked_again:
+            # Already queued: keep the place rather than jumping the line.
+            response = previous
+        elif claim_seat(rsvp.event_id, previous):
+            rsvp.waitlisted_at = None
+        else:
+            response = RSVP.RESPONSE_WAITLIST
+            rsvp.waitlisted_at = timezone.now()
+            shift_counters(rsvp.event_id, previous, None)
+    elif response != previous:
+        rsvp.waitlisted_at = None
+        shift_counters(rsvp.event_id, previous, response)
+    rsvp.response = response
+    rsvp.save()
+    # A seat given up here, or one that came free without a promotion (an
+    # admin deleting an RSVP, a raised cap), goes to the front of the queue,
+    # which may be this member.
+    if (previous == 'YES' and response != 'YES') or asked_again:
+        if promote_waitlist(rsvp.event_id) and asked_again:
+            rsvp.refresh_from_db(fields=['response', 'waitlisted_at'])
+    return rsvp
+
+
+def promote_waitlist(event_id):
+    # Fills free seats from the front of the queue, strictly in order, at a
+    # fixed two statements per promotion plus one to find the queue empty or
+    # the event full. Call with the event's row lock held (save_rsvp takes
+    # it first; an UPDATE or DELETE touching the event already has it), so
+    # the seat checked for below cannot be taken in between.
+    head = (
+        RSVP.objects.filter(event_id=event_id, response=RSVP.RESPONSE_WAITLIST)
+        .order_by('waitlisted_at', 'pk')
+        .values('pk')[:1]
+    )
+    has_room = Event.objects.filter(
+        Q(max_participants__isnull=True) | Q(count_yes__lt=F('max_participants')), pk=event_id,
+    )
+    promoted = 0
+    # A bulk UPDATE sends no post_save; every caller is already saving or
+    # deleting an RSVP or the event, which refreshes the live counts and the
+    # guild's caches for this event.
+    while RSVP.objects.filter(Exists(has_room), pk=Subquery(head), response=RSVP.RESPONSE_WAITLIST).update(
+        response='YES', waitlisted_at=None, updated_at=timezone.now(),
+    ):
+        shift_counters(event_id, None, 'YES')
+        promoted += 1
+    return promoted
+
+
+def waitlist_position(rsvp):
+    if rsvp is None or rsvp.response != RSVP.RESPONSE_WAITLIST:
+        return None
+    ahead = RSVP.objects.filter(event_id=rsvp.event_id, response=RSVP.RESPONSE_WAITLIST).filter(
+        Q(waitlisted_at__lt=rsvp.waitlisted_at) | Q(waitlisted_at=rsvp.waitlisted_at, pk__lt=rsvp.pk)
+    )
+    return ahead.count() + 1
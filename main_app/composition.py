@@ -0,0 +1,93 @@
+from django.db.models import Count, F, Q
+from .models import Role, ProfileRole, EventRoleSlot, TemplateRoleSlot
+
+ROLE_NAME_LENGTH = Role._meta.get_field('name').max_length
+
+
+def parse_roles(text):
+    # "Tank:2, Healer:3, DPS" -> {'Tank': 2, 'Healer': 3, 'DPS': 1}; a role
+    # listed twice without a count ("Tank,Tank") needs two.
+    counts = {}
+    for part in (text or '').replace(';', ',').split(','):
+        name, _, count = part.partition(':')
+        name = ' '.join(name.split())[:ROLE_NAME_LENGTH]
+        if not name:
+            continue
+        count = count.strip()
+        counts[name] = counts.get(name, 0) + (int(count) if count.isdigit() and int(count) > 0 else 1)
+    return counts
+
+
+def resolve_roles(names):
+    # Role names match case-insensitively; unknown ones are created.
+    names = set(names)
+    if not names:
+        return {}
+    roles = {role.name.lower(): role for role in Role.objects.all()}
+    missing = {name.lower(): name for name in names if name.lower() not in roles}
+    if missing:
+        Role.objects.bulk_create([Role(name=name) for name in missing.values()], ignore_conflicts=True)
+        roles = {role.name.lower(): role for role in Role.objects.all()}
+    return {name: roles[name.lower()] for name in names}
+
+
+def _sync(manager, model, owner, spec, required=True):
+    counts = parse_roles(spec)
+    roles = resolve_roles(counts)
+    wanted = {roles[name].pk: count for name, count in counts.items()}
+    existing = {slot.role_id: slot for slot in manager.all()}
+    manager.exclude(role_id__in=list(wanted)).delete()
+    to_create, to_update = [], []
+    for role_id, count in wanted.items():
+        slot = existing.get(role_id)
+        if slot is None:
+            to_create.append(model(role_id=role_id, **owner, **({'required': count} if required else {})))
+        elif required and slot.required != count:
+            slot.required = count
+            to_update.append(slot)
+    model.objects.bulk_create(to_create)
+    if to_update:
+        model.objects.bulk_update(to_update, ['required'])
+
+
+def sync_event_slots(event):
+    _sync(event.role_slots, EventRoleSlot, {'event': event}, event.required_roles)
+
+
+def sync_template_slots(template):
+    _sync(template.role_slots, TemplateRoleSlot, {'template': template}, template.default_roles)
+
+
+def sync_profile_roles(profile):
+    _sync(profile.profilerole_set, ProfileRole, {'profile': profile}, profile.preferred_roles, required=False)
+
+
+def slot_fill_rates(event_ids):
+    # One grouped query for the whole batch: each slot joined to the YES
+    # RSVPs of its event that signed up for that role.
+    by_event = {pk: [] for pk in event_ids}
+    if not by_event:
+        return by_event
+    rows = (
+        EventRoleSlot.objects.filter(event__in=list(by_event))
+        .values('event_id', 'role__name', 'required')
+        .annotate(filled=Count('event__rsvps', filter=Q(event__rsvps__response='YES', event__rsvps__role_id=F('role_id'))))
+        .order_by('event_id', 'role__name')
+    )
+    for row in rows:
+        by_event[row['event_id']].append(_rate(row['role__name'], row['required'], row['filled']))
+    return by_event
+
+
+def fill_rates(events):
+    events = list(events)
+    by_event = slot_fill_rates([e.pk for e in events if not e.is_virtual])
+    # Occurrences without a row yet have nobody signed up.
+    for event in events:
+        if event.is_virtual:
+            by_event[event.pk] = [_rate(name, count, 0) for name, count in sorted(parse_roles(event.required_roles).items())]
+    return by_event
+
+
+def _rate(role, required, filled):
+    return {'role': role, 'required': required, 'filled': filled, 'open': max(required - filled, 0)}
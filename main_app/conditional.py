@@ -0,0 +1,129 @@
+import hashlib
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max, OuterRef, Subquery, Value
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from .caching import guild_cache_version
+from .models import Guild, Membership, Event, EventSeries, RSVP, Profile
+from .routers import primary_reads
+
+
+# With a shared cache, the guild and event pages are validated by the
+# guild's cache version, which moves on every write they show (members,
+# events, RSVPs, profiles). A per-process cache only sees its own worker's
+# writes, so without one they are validated by the rows themselves: the
+# newest updated_at and the size of every set they show, in one query.
+
+def _changes(queryset):
+    rows = queryset.order_by().annotate(group=Value(1)).values('group')
+    return (
+        Subquery(rows.annotate(latest=Max('updated_at')).values('latest')),
+        Subquery(rows.annotate(total=Count('pk')).values('total')),
+    )
+
+
+def guild_validator(pk):
+    # The date moves the upcoming-events window.
+    today = timezone.localdate().isoformat()
+    if settings.SHARED_CACHE:
+        return guild_cache_version(pk), today
+    row = Guild.objects.filter(pk=pk).values_list(
+        'updated_at',
+        'owner__updated_at',
+        *_changes(Membership.objects.filter(guild=OuterRef('pk'))),
+        *_changes(Profile.objects.filter(membership__guild=OuterRef('pk'))),
+        *_changes(Event.objects.filter(guild=OuterRef('pk'))),
+        *_changes(EventSeries.objects.filter(guild=OuterRef('pk'))),
+    ).first()
+    return None if row is None else (*row, today)
+
+
+def event_validator(pk):
+    if settings.SHARED_CACHE:
+        row = Event.objects.filter(pk=pk).values_list('guild_id', 'updated_at').first()
+        if row is None:
+            return None
+        guild_id, updated_at = row
+        return guild_cache_version(guild_id), updated_at.isoformat()
+    # Memberships decide what the viewer may do on the page.
+    return Event.objects.filter(pk=pk).values_list(
+        'updated_at',
+        'count_yes',
+        'count_no',
+        'count_maybe',
+        'guild__updated_at',
+        *_changes(RSVP.objects.filter(event=OuterRef('pk'))),
+        *_changes(Membership.objects.filter(guild=OuterRef('guild'))),
+    ).first()
+
+
+def profile_validator(pk):
+    # Linked accounts have no timestamps; new rows always get a higher pk,
+    # so the count and the highest pk catch additions and removals alike.
+    stats = Profile.objects.filter(pk=pk).aggregate(
+        updated_at=Max('updated_at'),
+        guilds=Count('membership', distinct=True),
+        memberships_changed=Max('membership__updated_at'),
+        guilds_changed=Max('membership__guild__updated_at'),
+        accounts=Count('external_accounts', distinct=True),
+        latest_account=Max('external_accounts__pk'),
+    )
+    if stats['updated_at'] is None:
+        return None
+    return tuple(stats.values())
+
+
+def page_etag(request, user, parts):
+    # The page differs per viewer, and its forms carry a token tied to the
+    # CSRF cookie, so both go into the tag.
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    raw = ':'.join(str(part) for part in (*parts, user.pk, csrf))
+    return f'"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+
+def conditional_page(validator):
+    # Answers a repeat GET whose page has not changed with 304 before the
+    # view builds any context. validator(pk) returns what the page depends
+    # on, or None when there is nothing to validate against.
+    #
+    # The client keeps the page until its tag changes, so the tag and the
+    # page must describe the same rows: both are read from the primary (a
+    # TemplateResponse is rendered here, still inside), never from a replica
+    # that may be behind the write that moved the tag.
+    def etag_for(request, user, pk):
+        parts = validator(pk)
+        return None if parts is None else page_etag(request, user, parts)
+
+    def finish(etag, response):
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        if etag:
+            response.headers.setdefault('ETag', etag)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def inner(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                user = await request.auser()
+                with primary_reads():
+                    etag = await sync_to_async(etag_for)(request, user, kwargs['pk'])
+                    response = etag and get_conditional_response(request, etag=etag)
+                    response = response or await view(request, *args, **kwargs)
+                    return await sync_to_async(finish)(etag, response)
+        else:
+            @wraps(view)
+            def inner(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view(request, *args, **kwargs)
+                with primary_reads():
+                    etag = etag_for(request, request.user, kwargs['pk'])
+                    response = etag and get_conditional_response(request, etag=etag)
+                    return finish(etag, response or view(request, *args, **kwargs))
+        return inner
+    return decorator
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import Guild, Membership, Event, EventSeries
+from .recurrence import expand_window
+from .caching import guild_cache_version, guild_cache_versions, profile_cache_version
+from .routers import primary_reads
+
+DASHBOARD_EVENTS = 5
+DASHBOARD_TTL = getattr(settings, 'DASHBOARD_TTL', 10 * 60)
+
+
+def _build(profile, profile_version):
+    guilds = list(
+        Guild.objects.filter(
+            membership__profile=profile,
+            membership__status=Membership.STATUS_APPROVED,
+        ).values('pk', 'name').order_by('name')
+    )
+    guild_ids = [g['pk'] for g in guilds]
+    events = []
+    if guild_ids:
+        upcoming = expand_window(
+            Event.objects.filter(guild__in=guild_ids).only('pk', 'title', 'start_time', 'series_id', 'occurrence_start'),
+            EventSeries.objects.filter(guild__in=guild_ids),
+            timezone.now(),
+            limit=DASHBOARD_EVENTS,
+        )
+        events = [
+            {'title': e.title, 'start_time': e.start_time, 'url': e.get_absolute_url()}
+            for e in upcoming
+        ]
+    versions = guild_cache_versions(guild_ids)
+    for pk in guild_ids:
+        if pk not in versions:
+            versions[pk] = guild_cache_version(pk)
+    return {
+        'profile_version': profile_version,
+        'guild_versions': versions,
+        'guilds': guilds,
+        'events': events,
+    }
+
+
+def _is_fresh(feed, profile_version):
+    if feed is None or feed['profile_version'] != profile_version:
+        return False
+    return guild_cache_versions(feed['guild_versions']) == feed['guild_versions']
+
+
+def dashboard_feed(profile):
+    key = f'dashboard:{profile.pk}:feed'
+    profile_version = profile_cache_version(profile.pk)
+    feed = cache.get(key)
+    now = timezone.now()
+    if _is_fresh(feed, profile_version):
+        events = [e for e in feed['events'] if e['start_time'] >= now]
+        # A full list that has lost entries to the clock may have more
+        # events behind it; anything shorter was already everything.
+        if len(events) == len(feed['events']) or len(feed['events']) < DASHBOARD_EVENTS:
+            return {'guilds': feed['guilds'], 'events': events}
+
+    with primary_reads():
+        feed = _build(profile, profile_version)
+    cache.set(key, feed, DASHBOARD_TTL)
+    return {'guilds': feed['guilds'], 'events': feed['events']}
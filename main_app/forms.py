@@ -1,5 +1,9 @@
 from django import forms
-from .models import Profile, Event, EventTemplate, RSVP, ExternalAccount
+from .models import Profile, Event, EventSeries, EventTemplate, RSVP, ExternalAccount, Role
+
+WEEKDAY_CHOICES = [
+    ('0', 'Mon'), ('1', 'Tue'), ('2', 'Wed'), ('3', 'Thu'), ('4', 'Fri'), ('5', 'Sat'), ('6', 'Sun'),
+]
 
 
 class ProfileForm(forms.ModelForm):
@@ -28,6 +32,23 @@ class EventCreateForm(forms.ModelForm):
         required= False,
         label= 'save this event as a new template' 
     )        
+    repeat = forms.TypedChoiceField(
+        choices=[('', 'Does not repeat')] + EventSeries.INTERVAL_CHOICES,
+        coerce=int,
+        empty_value=None,
+        required=False,
+    )
+    repeat_days = forms.MultipleChoiceField(
+        choices=WEEKDAY_CHOICES,
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+        label='Repeat on',
+    )
+    repeat_until = forms.DateTimeField(
+        required=False,
+        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+        label='Repeat until',
+    )
     class Meta:
         model = Event
         fields = [
@@ -47,18 +68,26 @@ class EventCreateForm(forms.ModelForm):
         }
 
 class RSVPform(forms.ModelForm):
+    role = forms.ModelChoiceField(queryset=Role.objects.all(), to_field_name='name', required=False)
+
     class Meta:
         model = RSVP
         fields = [
             'response',
-            'role_signed_up',    
+            'role',
         ]
 
         widgets = {
             'response': forms.Select(),
-            'role_signed_up': forms.TextInput(attrs={'placeholder': 'dps-tank-heal','class': 'form-control'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The waitlist is assigned by the capacity check, never picked.
+        self.fields['response'].choices = [
+            choice for choice in self.fields['response'].choices if choice[0] != RSVP.RESPONSE_WAITLIST
+        ]
+
 class ExternalAccountForm(forms.ModelForm):
     class Meta:
         model = ExternalAccount
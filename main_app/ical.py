@@ -0,0 +1,136 @@
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from django.core import signing
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.db.models import Count, Max, Value
+
+FEED_SALT = 'main_app.ical'
+FEED_CHUNK_SIZE = 500
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+
+def feed_token(kind, pk, profile):
+    # Issued to one profile, so the feed can check that profile may still
+    # see it, and signed with its feed_version, so rotating that revokes
+    # every URL handed out before.
+    signature = signing.Signer(salt=FEED_SALT).signature(f'{kind}:{pk}:{profile.pk}:{profile.feed_version}')
+    return f'{profile.pk}-{signature}'
+
+
+def feed_token_profile(token):
+    profile_pk, _, _ = token.partition('-')
+    return int(profile_pk) if profile_pk.isdigit() else None
+
+
+def check_feed_token(kind, pk, token, profile):
+    return constant_time_compare(feed_token(kind, pk, profile), token)
+
+
+def feed_validators(*querysets):
+    # Latest change and row count of every source in one query: a UNION of
+    # one aggregate row per queryset, which an empty one leaves out.
+    stats = [
+        qs.order_by().annotate(source=Value(i)).values('source').annotate(latest=Max('updated_at'), total=Count('pk'))
+        for i, qs in enumerate(querysets)
+    ]
+    rows = {row['source']: row for row in stats[0].union(*stats[1:], all=True)}
+    stats = [rows.get(i, {'latest': None, 'total': 0}) for i in range(len(querysets))]
+    stamps = [s['latest'] for s in stats if s['latest'] is not None]
+    if not stamps:
+        return None, None
+    parts = ':'.join(f"{s['latest'].isoformat() if s['latest'] else '-'}:{s['total']}" for s in stats)
+    return f'"{hashlib.sha1(parts.encode()).hexdigest()}"', max(stamps)
+
+
+def _escape(text):
+    return (
+        text.replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    # RFC 5545 3.1: lines longer than 75 octets continue with CRLF + space.
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _stamp(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _wall_stamp(value):
+    # Recurring events keep their wall-clock time across DST, so they are
+    # written in the site's zone rather than UTC.
+    zone = getattr(timezone.get_current_timezone(), 'key', 'UTC')
+    if zone == 'UTC':
+        return f':{_stamp(value)}'
+    return f";TZID={zone}:{timezone.localtime(value).strftime('%Y%m%dT%H%M%S')}"
+
+
+def _series_lines(series, build_url):
+    rule = f'RRULE:FREQ=WEEKLY;INTERVAL={series.interval};BYDAY={",".join(WEEKDAYS[d] for d in sorted(series.weekday_set()))}'
+    if series.until:
+        rule += f';UNTIL={_stamp(series.until)}'
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:series-{series.pk}@super-sweat',
+        f'DTSTAMP:{_stamp(series.updated_at)}',
+        f'LAST-MODIFIED:{_stamp(series.updated_at)}',
+        f'DTSTART{_wall_stamp(series.starts_at)}',
+        f'DTEND{_wall_stamp(series.starts_at + series.duration)}',
+        rule,
+    ]
+    for stamp in sorted(series.exdates):
+        lines.append(f'EXDATE{_wall_stamp(datetime.fromtimestamp(stamp, tz=dt_timezone.utc))}')
+    lines += [f'SUMMARY:{_escape(series.title)}', f'URL:{build_url(series.get_absolute_url())}']
+    if series.description:
+        lines.append(f'DESCRIPTION:{_escape(series.description)}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def ics_stream(events, series, calendar_name, build_url):
+    yield _fold('BEGIN:VCALENDAR')
+    yield _fold('VERSION:2.0')
+    yield _fold('PRODID:-//Super Sweat//Guild Calendar//EN')
+    yield _fold('CALSCALE:GREGORIAN')
+    yield _fold(f'X-WR-CALNAME:{_escape(calendar_name)}')
+    # One VEVENT + RRULE per series however many weeks it has run; rows
+    # that were materialized go out as overrides of their occurrence.
+    for item in series.iterator(chunk_size=FEED_CHUNK_SIZE):
+        yield ''.join(_fold(line) for line in _series_lines(item, build_url))
+    for event in events.iterator(chunk_size=FEED_CHUNK_SIZE):
+        if event.series_id:
+            uid = [f'UID:series-{event.series_id}@super-sweat', f'RECURRENCE-ID{_wall_stamp(event.occurrence_start)}']
+        else:
+            uid = [f'UID:{event.pk}@super-sweat']
+        lines = [
+            'BEGIN:VEVENT',
+            *uid,
+            f'DTSTAMP:{_stamp(event.updated_at)}',
+            f'LAST-MODIFIED:{_stamp(event.updated_at)}',
+            f'DTSTART:{_stamp(event.start_time)}',
+            f'DTEND:{_stamp(event.end_time)}',
+            f'SUMMARY:{_escape(event.title)}',
+            f'URL:{build_url(event.get_absolute_url())}',
+        ]
+        if event.description:
+            lines.append(f'DESCRIPTION:{_escape(event.description)}')
+        lines.append('END:VEVENT')
+        yield ''.join(_fold(line) for line in lines)
+    yield _fold('END:VCALENDAR')
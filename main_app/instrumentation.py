@@ -0,0 +1,247 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = getattr(settings, 'PERF_SAMPLE_SIZE', 500)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+class RequestStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.queries += 1
+                self.db_time += time.perf_counter() - started
+
+
+# Async views run their queries on worker threads, each with its own
+# connection, so the wrapper lives on every connection and finds the
+# request's stats through the (thread-propagated) context.
+_current_stats = ContextVar('perf_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def _install_wrapper(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def instrument_connections():
+    # Connections are per thread; call from any thread that runs a
+    # request's queries, in case its connections predate the signal below.
+    for alias in connections:
+        _install_wrapper(connections[alias])
+
+
+connection_created.connect(_install_wrapper)
+
+
+class ViewStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=SAMPLE_SIZE))
+
+    def record(self, name, queries, db_ms, render_ms, total_ms):
+        with self._lock:
+            self._samples[name].append((queries, db_ms, render_ms, total_ms))
+
+    def summary(self):
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+        return {name: _summarise(samples) for name, samples in sorted(snapshot.items())}
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _summarise(samples):
+    columns = dict(zip(('queries', 'db_ms', 'render_ms', 'total_ms'), zip(*samples)))
+    out = {'requests': len(samples)}
+    for column, values in columns.items():
+        out[column] = {
+            'p50': round(percentile(values, 50), 2),
+            'p95': round(percentile(values, 95), 2),
+            'max': round(max(values), 2),
+        }
+    return out
+
+
+view_stats = ViewStats()
+
+
+def _budget_for(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    if view_class is not None:
+        return getattr(view_class, 'query_budget', None)
+    return getattr(view_func, 'query_budget', None)
+
+
+def _counted(response, stats, report):
+    # Puts the request's stats back in context around each chunk, since the
+    # server pulls them outside the middleware, and reports at the end.
+    content = response.streaming_content
+    if response.is_async:
+        async def chunks():
+            try:
+                while True:
+                    token = _current_stats.set(stats)
+                    try:
+                        chunk = await anext(content)
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        _current_stats.reset(token)
+                    yield chunk
+            finally:
+                report()
+    else:
+        def chunks():
+            iterator = iter(content)
+            try:
+                while True:
+                    token = _current_stats.set(stats)
+                    try:
+                        chunk = next(iterator)
+                    except StopIteration:
+                        break
+                    finally:
+                        _current_stats.reset(token)
+                    yield chunk
+            finally:
+                report()
+    return chunks()
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self._finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats, token, started = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        return self._finish(request, response, stats, started)
+
+    def _start(self, request):
+        instrument_connections()
+        stats = request._perf_stats = RequestStats()
+        return stats, _current_stats.set(stats), time.perf_counter()
+
+    def _finish(self, request, response, stats, started):
+        if getattr(settings, 'PERF_HEADERS', settings.DEBUG):
+            # For a streamed body, only what ran before the first byte.
+            total_ms = (time.perf_counter() - started) * 1000
+            response['X-Query-Count'] = str(stats.queries)
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                f'render;dur={stats.render_time * 1000:.1f}, total;dur={total_ms:.1f}'
+            )
+        if response.streaming:
+            # The body runs its queries after this returns; they are counted
+            # against the budget once it has been sent.
+            response.streaming_content = _counted(response, stats, lambda: self._report(request, stats, started))
+        else:
+            self._report(request, stats, started)
+        return response
+
+    def _report(self, request, stats, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        name = match.view_name if match else 'unresolved'
+        view_stats.record(name, stats.queries, stats.db_time * 1000, stats.render_time * 1000, total_ms)
+
+        budget = getattr(request, '_query_budget', None)
+        if budget is not None and stats.queries > budget:
+            message = f'{name} ran {stats.queries} queries, over its budget of {budget}'
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = _budget_for(view_func)
+
+
+class TimedTemplate(Template):
+    # Every render goes through here, whether from render(), render_to_string()
+    # or a TemplateResponse; renders nested inside another count once.
+    def render(self, context=None, request=None):
+        stats = _current_stats.get()
+        if stats is None or stats.rendering:
+            return super().render(context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.rendering = False
+            stats.render_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.db.models import Count
+from django.utils.module_loading import import_string
+from .asyncdb import parallel
+from .models import Event, RSVP
+from .tallies import COUNTER_FIELDS
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = getattr(settings, 'LIVE_HEARTBEAT', 15)
+RETRY_MS = getattr(settings, 'LIVE_RETRY_MS', 5000)
+
+
+class Subscription:
+    # Only the newest message is kept: viewers want the current counts, not
+    # every step in between, so a slow client never builds up a backlog.
+    def __init__(self, loop):
+        self._loop = loop
+        self._ready = asyncio.Event()
+        self._message = None
+
+    def _deliver(self, message):
+        self._message = message
+        self._ready.set()
+
+    def push(self, message):
+        self._loop.call_soon_threadsafe(self._deliver, message)
+
+    async def get(self, timeout=None):
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        message, self._message = self._message, None
+        return message
+
+
+class LocalBroker:
+    # Reaches subscribers in this process only; with several workers use
+    # PostgresBroker so a write in one process reaches viewers in all.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, channel, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[channel]
+
+    def has_subscribers(self, channel):
+        return channel in self._channels
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.push(message)
+            except RuntimeError:
+                # Its event loop has closed.
+                self.unsubscribe(channel, subscription)
+
+
+class PostgresBroker(LocalBroker):
+    # Publishes through NOTIFY and runs one LISTEN connection per process
+    # that fans notifications out to the local subscribers.
+    CHANNEL = 'main_app_live'
+
+    def __init__(self, using='default'):
+        super().__init__()
+        self.using = using
+        self._listener = None
+        self._start_lock = threading.Lock()
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def has_subscribers(self, channel):
+        return True
+
+    def publish(self, channel, message):
+        payload = json.dumps({'channel': channel, 'message': message})
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.CHANNEL, payload])
+
+    def _ensure_listener(self):
+        with self._start_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='live-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                # A dedicated connection, never one borrowed from the pool:
+                # LISTEN holds it for the life of the process.
+                wrapper = connections.create_connection(self.using)
+                conn = wrapper.Database.connect(**wrapper.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.CHANNEL}')
+                for payload in self._notifications(conn):
+                    data = json.loads(payload)
+                    self.deliver(data['channel'], data['message'])
+            except Exception:
+                logger.exception('Live listener lost its connection; reconnecting')
+                time.sleep(1)
+
+    def _notifications(self, conn):
+        if is_psycopg3:
+            while True:
+                for notify in conn.notifies(timeout=HEARTBEAT):
+                    yield notify.payload
+        while True:
+            if select.select([conn], [], [], HEARTBEAT) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                yield conn.notifies.pop(0).payload
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'LIVE_BROKER', 'main_app.live.LocalBroker'))()
+
+
+def event_channel(event_id):
+    return f'event:{event_id}'
+
+
+def rsvp_snapshot(event_id):
+    snapshot = Event.objects.filter(pk=event_id).values(*COUNTER_FIELDS.values()).first()
+    if snapshot is None:
+        return None
+    roles = (
+        RSVP.objects.filter(event_id=event_id, response='YES', role__isnull=False)
+        .values_list('role__name')
+        .annotate(signed_up=Count('pk'))
+        .order_by('role__name')
+    )
+    snapshot['roles'] = dict(roles)
+    return snapshot
+
+
+def publish_rsvp_counts(event_id):
+    channel = event_channel(event_id)
+    broker = get_broker()
+    if not broker.has_subscribers(channel):
+        return
+    snapshot = rsvp_snapshot(event_id)
+    if snapshot is not None:
+        broker.publish(channel, snapshot)
+
+
+def schedule_rsvp_publish(event_id):
+    transaction.on_commit(lambda: publish_rsvp_counts(event_id))
+
+
+def _sse(message):
+    return f'event: rsvp\ndata: {json.dumps(message)}\n\n'
+
+
+async def rsvp_stream(event_id):
+    channel = event_channel(event_id)
+    broker = get_broker()
+    subscription = broker.subscribe(channel)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        # Subscribed first, so nothing published after this snapshot is lost.
+        (snapshot,) = await parallel(lambda: rsvp_snapshot(event_id))
+        if snapshot is None:
+            return
+        yield _sse(snapshot)
+        while True:
+            message = await subscription.get(HEARTBEAT)
+            yield ': keepalive\n\n' if message is None else _sse(message)
+    finally:
+        broker.unsubscribe(channel, subscription)
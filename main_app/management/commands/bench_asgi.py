@@ -0,0 +1,147 @@
+import http.client
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from main_app.instrumentation import percentile
+from main_app.models import Guild, Membership, Event
+
+MODES = {
+    'wsgi': (['super_sweat.wsgi:application', '-k', 'sync'], '0'),
+    'asgi': (['super_sweat.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'], '1'),
+}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Start the site under sync gunicorn (WSGI) and under uvicorn workers (ASGI with ASYNC_VIEWS) '
+        'and compare throughput of the event detail, guild detail and RSVP paths. '
+        'Runs against the configured database, so seed it first (manage.py seed_bench).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='wsgi,asgi', help=f"Comma-separated: {', '.join(MODES)}")
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=32, help='Simultaneous client connections.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per path.')
+        parser.add_argument('--output', default='bench_asgi.json', help='Where to write JSON results.')
+
+    def handle(self, *args, modes, workers, concurrency, requests, output, **options):
+        modes = [m.strip() for m in modes.split(',') if m.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+        guild = Guild.objects.order_by('-pk').first()
+        member = (
+            Membership.objects.filter(guild=guild, status=Membership.STATUS_APPROVED)
+            .exclude(profile_id=getattr(guild, 'owner_id', None))
+            .select_related('profile__user').first()
+        )
+        event = Event.objects.filter(guild=guild).upcoming().first() or Event.objects.filter(guild=guild).first()
+        if member is None or event is None:
+            raise CommandError('No guild with an approved member and an event; run seed_bench first.')
+
+        client = Client()
+        client.force_login(member.profile.user)
+        csrf = secrets.token_hex(16)
+        headers = {
+            'Cookie': f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; '
+                      f'{settings.CSRF_COOKIE_NAME}={csrf}',
+            'X-CSRFToken': csrf,
+        }
+        cases = [
+            ('event-detail', 'GET', reverse('event-detail', args=[event.pk]), None),
+            ('guild-detail', 'GET', reverse('guild-detail', args=[guild.pk]), None),
+            ('rsvp', 'POST', reverse('rsvp', args=[event.pk]), 'response=YES'),
+        ]
+
+        results = []
+        for mode in modes:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{mode}: {workers} workers, {concurrency} clients'))
+            port = _free_port()
+            server = self.start_server(mode, port, workers)
+            try:
+                for view, method, url, body in cases:
+                    row = self.load(port, method, url, body, headers, concurrency, requests)
+                    row.update(mode=mode, view=view, workers=workers, concurrency=concurrency)
+                    results.append(row)
+                    self.stdout.write(
+                        f"  {view:<14} {row['rps']:8.1f} req/s  p50 {row['p50_ms']:8.2f}ms  "
+                        f"p95 {row['p95_ms']:8.2f}ms  errors {row['errors']}"
+                    )
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        with open(output, 'w') as fh:
+            json.dump({'results': results}, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'\nWrote {output}'))
+
+    def start_server(self, mode, port, workers):
+        app, async_views = MODES[mode]
+        env = dict(os.environ, ASYNC_VIEWS=async_views)
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *app, '-w', str(workers), '-b', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'{mode} server exited with {server.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'{mode} server did not start listening on port {port}')
+
+    def load(self, port, method, url, body, headers, concurrency, requests):
+        headers = dict(headers)
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        def fetch(_):
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            started = time.perf_counter()
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 400
+            except OSError:
+                ok = False
+            finally:
+                conn.close()
+            return (time.perf_counter() - started) * 1000, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(fetch, range(requests)))
+        elapsed = time.perf_counter() - started
+        timings = [ms for ms, ok in samples if ok]
+        if not timings:
+            raise CommandError(f'Every request to {url} failed')
+        return {
+            'requests': requests,
+            'errors': requests - len(timings),
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'max_ms': round(max(timings), 3),
+        }
@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.db.backends.signals import connection_created
+from main_app.instrumentation import percentile
+from main_app.models import Guild
+
+MODES = {
+    'none': {'CONN_MAX_AGE': 0},
+    'persistent': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True},
+    'pool': {'CONN_MAX_AGE': 0, 'pool': {'min_size': 2, 'max_size': 4}},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay the request_started/request_finished cycle Django runs around every request, with one small '
+        'query in between, under each connection mode, and report the per-request cost. Runs against the '
+        'configured database; the "pool" mode needs PostgreSQL with psycopg 3.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', default='none,persistent,pool', help=f"Comma-separated: {', '.join(MODES)}")
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=4, help='Like threads in a gthread/ASGI worker.')
+
+    def handle(self, *args, modes, requests, threads, **options):
+        modes = [m.strip() for m in modes.split(',') if m.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+        settings_dict = connections[DEFAULT_DB_ALIAS].settings_dict
+        if 'pool' in modes and not (settings_dict['ENGINE'] == 'django.db.backends.postgresql' and is_psycopg3):
+            self.stdout.write(self.style.WARNING('Skipping pool: it needs PostgreSQL with psycopg 3.'))
+            modes.remove('pool')
+
+        original = {key: settings_dict.get(key) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        original_options = dict(settings_dict.get('OPTIONS', {}))
+        opened = []
+        lock = threading.Lock()
+
+        def count_connect(sender, connection, **kwargs):
+            with lock:
+                opened.append(connection.alias)
+
+        connection_created.connect(count_connect)
+        try:
+            baseline = None
+            for mode in modes:
+                self.configure(settings_dict, mode, original, original_options)
+                opened.clear()
+                timings = self.run(requests, threads)
+                connects = len(opened)
+                if mode == 'pool':
+                    # connection_created fires on every checkout; the pool
+                    # knows how many it really opened.
+                    connects = connections[DEFAULT_DB_ALIAS].pool.get_stats().get('connections_num', 0)
+                p50 = percentile(timings, 50)
+                baseline = p50 if baseline is None else baseline
+                self.stdout.write(
+                    f'{mode:<11} p50 {p50:7.3f}ms  p95 {percentile(timings, 95):7.3f}ms  '
+                    f'connects {connects:>5} / {requests} requests  '
+                    f'saved vs {modes[0]} {baseline - p50:7.3f}ms per request'
+                )
+        finally:
+            connection_created.disconnect(count_connect)
+            self.configure(settings_dict, None, original, original_options)
+
+    def configure(self, settings_dict, mode, original, original_options):
+        connections.close_all()
+        if getattr(connections[DEFAULT_DB_ALIAS], 'pool', None):
+            connections[DEFAULT_DB_ALIAS].close_pool()
+        settings_dict.update(original)
+        settings_dict['OPTIONS'] = dict(original_options)
+        settings_dict['OPTIONS'].pop('pool', None)
+        for key, value in MODES.get(mode, {}).items():
+            if key == 'pool':
+                settings_dict['OPTIONS']['pool'] = value
+            else:
+                settings_dict[key] = value
+
+    def run(self, requests, threads):
+        def one_request(_):
+            started = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            try:
+                Guild.objects.using(DEFAULT_DB_ALIAS).only('pk').first()
+            finally:
+                request_finished.send(sender=self.__class__)
+            return (time.perf_counter() - started) * 1000
+
+        # Connections belong to the thread that opened them; the barrier makes
+        # every worker thread take exactly one of these and close its own.
+        barrier = threading.Barrier(threads)
+
+        def close_thread_connections(_):
+            barrier.wait()
+            connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            timings = list(pool.map(one_request, range(requests)))
+            list(pool.map(close_thread_connections, range(threads)))
+        return timings
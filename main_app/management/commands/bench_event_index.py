@@ -0,0 +1,99 @@
+import random
+import time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+from main_app.models import Profile, Guild, Event
+
+BENCH_PREFIX = 'bench-index'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large Event table in a throwaway test database and show the plan and timing of the '
+        'upcoming-events queries. --keepdb keeps the seeded database for the next run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1_000_000)
+        parser.add_argument('--guilds', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, keepdb, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+        try:
+            self.run_bench(options)
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+            teardown_test_environment()
+
+    def run_bench(self, options):
+        guilds = self.seed(options['events'], options['guilds'], options['batch_size'])
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE main_app_event')
+
+        now = timezone.now()
+        sample = random.sample(guilds, min(10, len(guilds)))
+        queries = {
+            'guild-detail': lambda g: Event.objects.filter(guild=g).upcoming(now, now + timedelta(days=30)),
+            'home': lambda g: Event.objects.filter(guild__in=sample).upcoming(now)[:5],
+        }
+        for label, build in queries.items():
+            qs = build(sample[0])
+            plan = qs.explain(analyze=True) if connection.vendor == 'postgresql' else qs.explain()
+            uses_index = 'event_guild_start_idx' in plan
+            timings = []
+            for i in range(options['runs']):
+                started = time.perf_counter()
+                list(build(sample[i % len(sample)]))
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+            self.stdout.write(plan)
+            self.stdout.write(
+                f'index used: {uses_index}  '
+                f'p50 {timings[len(timings) // 2]:.2f}ms  max {timings[-1]:.2f}ms'
+            )
+
+    def seed(self, total, guild_count, batch_size):
+        guilds = list(Guild.objects.filter(name__startswith=BENCH_PREFIX))
+        existing = Event.objects.filter(guild__in=guilds).count() if guilds else 0
+        if existing >= total:
+            return guilds
+
+        user, _ = get_user_model().objects.get_or_create(username=BENCH_PREFIX)
+        owner, _ = Profile.objects.get_or_create(user=user, defaults={'display_name': BENCH_PREFIX})
+        if len(guilds) < guild_count:
+            Guild.objects.bulk_create(
+                [Guild(name=f'{BENCH_PREFIX}-{i}', owner=owner) for i in range(len(guilds), guild_count)]
+            )
+            guilds = list(Guild.objects.filter(name__startswith=BENCH_PREFIX))
+
+        # Spread events two years either side of now so most rows fall
+        # outside any "upcoming" window.
+        now = timezone.now()
+        span = int(timedelta(days=730).total_seconds())
+        remaining = total - existing
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            batch = []
+            for _ in range(size):
+                start = now + timedelta(seconds=random.randint(-span, span))
+                batch.append(Event(
+                    guild=random.choice(guilds),
+                    title='Bench raid',
+                    start_time=start,
+                    end_time=start + timedelta(hours=2),
+                ))
+            Event.objects.bulk_create(batch)
+            remaining -= size
+            self.stdout.write(f'seeded {total - remaining}/{total} events', ending='\r')
+        self.stdout.write('')
+        return guilds
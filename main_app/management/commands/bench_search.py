@@ -0,0 +1,91 @@
+import random
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from main_app.instrumentation import percentile
+from main_app.models import Profile, Guild
+from main_app.search import search, autocomplete, ranked_queryset, search_terms, bump_search_index
+
+BENCH_PREFIX = 'bench-search'
+WORDS = [
+    'dragon', 'shadow', 'iron', 'raid', 'legion', 'storm', 'frost', 'ember', 'night', 'crimson', 'void',
+    'arcane', 'wolf', 'phoenix', 'titan', 'rogue', 'mythic', 'guardian', 'sweat', 'casual', 'hardcore',
+    'tank', 'healer', 'sniper', 'squad', 'clan', 'order', 'empire', 'knights', 'vanguard', 'rift', 'nova',
+]
+QUERIES = ['drag', 'shadow legion', 'myth', 'iron knights', 'phoenix', 'casual raid', 'vang', 'crimson storm']
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large Guild table in a throwaway test database and time ranked search and autocomplete '
+        'against it. --keepdb keeps the seeded database for the next run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--guilds', type=int, default=100_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, keepdb, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+        try:
+            self.run_bench(options)
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+            teardown_test_environment()
+
+    def run_bench(self, options):
+        self.seed(options['guilds'], options['batch_size'])
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE main_app_guild')
+            plan = ranked_queryset('guilds', search_terms(QUERIES[0]), Guild.objects.all())[:24].explain(analyze=True)
+            self.stdout.write(self.style.MIGRATE_HEADING('\nsearch plan'))
+            self.stdout.write(plan)
+        else:
+            # The in-process index is built on first use; keep that out of the timings.
+            started = time.perf_counter()
+            search('guilds', QUERIES[0])
+            self.stdout.write(f'in-process index built in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+        cases = {
+            'search': lambda q: list(search('guilds', q)),
+            'search page 3': lambda q: list(search('guilds', q, page=3)),
+            'autocomplete': lambda q: autocomplete('guilds', q[:4]),
+        }
+        for label, run in cases.items():
+            timings = []
+            for i in range(options['runs']):
+                started = time.perf_counter()
+                run(QUERIES[i % len(QUERIES)])
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f'{label:<14} p50 {percentile(timings, 50):8.2f}ms  '
+                f'p95 {percentile(timings, 95):8.2f}ms  max {max(timings):8.2f}ms'
+            )
+
+    def seed(self, total, batch_size):
+        existing = Guild.objects.filter(name__startswith=BENCH_PREFIX).count()
+        if existing >= total:
+            return
+        user, _ = get_user_model().objects.get_or_create(username=BENCH_PREFIX)
+        owner, _ = Profile.objects.get_or_create(user=user, defaults={'display_name': BENCH_PREFIX})
+        rng = random.Random(1)
+        for start in range(existing, total, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, total)):
+                words = rng.sample(WORDS, 2)
+                batch.append(Guild(
+                    name=f'{BENCH_PREFIX} {" ".join(words).title()} {i}',
+                    description=' '.join(rng.choices(WORDS, k=12)),
+                    owner=owner,
+                ))
+            Guild.objects.bulk_create(batch)
+            self.stdout.write(f'seeded {start + len(batch)}/{total} guilds', ending='\r')
+        self.stdout.write('')
+        # bulk_create skips the signals that keep the in-process index fresh.
+        bump_search_index('guilds')
@@ -0,0 +1,116 @@
+import json
+import platform
+import time
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from main_app.instrumentation import percentile
+from main_app.models import Guild, Membership, Event
+from main_app.seeding import seed_bench
+
+SIZES = {
+    'small': dict(users=200, guilds=20, members_per_guild=50, events_per_guild=20),
+    'medium': dict(users=2000, guilds=100, members_per_guild=300, events_per_guild=60),
+    'large': dict(users=10000, guilds=300, members_per_guild=1500, events_per_guild=120),
+}
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway test database at several sizes and benchmark the core views through the test client.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', help=f"Comma-separated: {', '.join(SIZES)}")
+        parser.add_argument('--runs', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', default='bench_results.json', help='Where to write JSON results.')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, sizes, runs, warmup, output, keepdb, **options):
+        sizes = [s.strip() for s in sizes.split(',') if s.strip()]
+        unknown = set(sizes) - set(SIZES)
+        if unknown:
+            raise CommandError(f"Unknown sizes: {', '.join(sorted(unknown))}")
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+        results = []
+        try:
+            for size in sizes:
+                call_command('flush', interactive=False, verbosity=0)
+                cache.clear()
+                started = time.perf_counter()
+                counts = seed_bench(seed=1, **SIZES[size])
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"\n{size}: seeded {counts} in {time.perf_counter() - started:.1f}s"
+                ))
+                for row in self.bench_size(size, runs, warmup):
+                    row['dataset'] = counts
+                    results.append(row)
+                    self.stdout.write(
+                        f"  {row['view']:<14} p50 {row['p50_ms']:8.2f}ms  p95 {row['p95_ms']:8.2f}ms  "
+                        f"p99 {row['p99_ms']:8.2f}ms  queries {row['queries']}"
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+            teardown_test_environment()
+
+        with open(output, 'w') as fh:
+            json.dump({
+                'meta': {
+                    'timestamp': timezone.now().isoformat(),
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                    'database': connection.vendor,
+                    'runs': runs,
+                },
+                'results': results,
+            }, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'\nWrote {output}'))
+
+    def bench_size(self, size, runs, warmup):
+        guild = Guild.objects.order_by('-pk').first()
+        member = (
+            Membership.objects.filter(guild=guild, status=Membership.STATUS_APPROVED, role='MEMBER')
+            .select_related('profile__user').first()
+        )
+        event = Event.objects.filter(guild=guild).upcoming().first() or Event.objects.filter(guild=guild).first()
+        client = Client()
+        client.force_login(member.profile.user)
+
+        responses = iter(['YES', 'NO', 'MAYBE'] * (runs + warmup))
+        cases = [
+            ('home', 'get', reverse('home'), None),
+            ('guild-list', 'get', reverse('guild-list'), None),
+            ('guild-detail', 'get', reverse('guild-detail', args=[guild.pk]), None),
+            ('event-detail', 'get', reverse('event-detail', args=[event.pk]), None),
+            ('rsvp', 'post', reverse('rsvp', args=[event.pk]), lambda: {'response': next(responses)}),
+        ]
+        for view, method, url, data in cases:
+            timings, queries = [], 0
+            for i in range(warmup + runs):
+                payload = data() if data else None
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, payload) if payload else getattr(client, method)(url)
+                    elapsed = (time.perf_counter() - started) * 1000
+                if response.status_code >= 400:
+                    raise CommandError(f'{view} returned {response.status_code}')
+                if i >= warmup:
+                    timings.append(elapsed)
+                    queries = max(queries, len(captured))
+            yield {
+                'size': size,
+                'view': view,
+                'runs': runs,
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'max_ms': round(max(timings), 3),
+                'queries': queries,
+            }
@@ -0,0 +1,72 @@
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+from main_app.models import Guild, Membership, Event
+from main_app.routers import PIN_COOKIE, replicas
+from main_app.seeding import seed_bench
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive a few requests through the test client and report which database served them: reads on a '
+        'replica; writes, the requests right after them and pages sent with an ETag on default. Needs DATABASE_REPLICA_URLS; replicas '
+        'mirror default in the throwaway test database, so two names for one SQLite file are enough.'
+    )
+
+    def handle(self, *args, **options):
+        if not replicas():
+            raise CommandError('No replicas configured; set DATABASE_REPLICA_URLS.')
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            failures = self.run_check()
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Routing as expected'))
+
+    def run_check(self):
+        seed_bench(users=20, guilds=1, members_per_guild=20, events_per_guild=3, pending_rate=0, prefix='routing', seed=1)
+        guild = Guild.objects.get(name__startswith='routing-guild-')
+        member = Membership.objects.filter(guild=guild).exclude(profile=guild.owner).select_related('profile__user').first()
+        event = Event.objects.filter(guild=guild).first()
+        client = Client()
+        client.force_login(member.profile.user)
+
+        failures = []
+        steps = [
+            ('read', 'get', reverse('guild-roster', args=[guild.pk]), 'replica'),
+            # A page sent with an ETag, and the fragments cached under the
+            # guild's version, is read from the primary (see primary_reads);
+            # the session and user before it still come from a replica.
+            ('read with ETag', 'get', reverse('guild-detail', args=[guild.pk]), 'both'),
+            ('write', 'post', reverse('rsvp', args=[event.pk]), 'default'),
+            ('read after write', 'get', reverse('guild-roster', args=[guild.pk]), 'default'),
+        ]
+        for label, method, url, expected in steps:
+            failures += self.step(client, label, method, url, expected)
+        client.cookies[PIN_COOKIE] = '0'
+        failures += self.step(client, 'read after pin expiry', 'get', reverse('guild-roster', args=[guild.pk]), 'replica')
+        return failures
+
+    def step(self, client, label, method, url, expected):
+        aliases = [DEFAULT_DB_ALIAS, *replicas()]
+        with ExitStack() as stack:
+            captured = {alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in aliases}
+            data = {'response': 'YES'} if method == 'post' else None
+            response = getattr(client, method)(url, data)
+        counts = {alias: len(captured[alias].captured_queries) for alias in aliases}
+        on_replicas = sum(counts[alias] for alias in replicas())
+        self.stdout.write(f'  {label:<22} {response.status_code}  ' + '  '.join(f'{a}={n}' for a, n in counts.items()))
+        if expected == 'default' and on_replicas:
+            return [f'{label}: {on_replicas} queries went to a replica']
+        if expected == 'replica' and not on_replicas:
+            return [f'{label}: nothing was read from a replica']
+        if expected == 'both' and not (on_replicas and counts[DEFAULT_DB_ALIAS]):
+            return [f'{label}: expected reads on both default and a replica']
+        return []
@@ -0,0 +1,122 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import Client
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+from main_app.models import Guild, Membership, Event, RSVP
+from main_app.seeding import seed_bench
+from main_app.tallies import count_rsvps
+
+
+class Command(BaseCommand):
+    help = (
+        'Load tool: seed a throwaway test database, fire hundreds of parallel RSVPs at two capped events '
+        'through the test client, then have some members drop out, reporting throughput and any broken '
+        'cap or waitlist order. The guarantee itself is tested by ConcurrentRSVPTests in main_app/tests.py; '
+        'this is for watching it under load. Run it against PostgreSQL; SQLite serializes every write anyway.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=300)
+        parser.add_argument('--capacity', type=int, default=40)
+        parser.add_argument('--drop', type=int, default=20, help='Confirmed members who switch to NO afterwards.')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, members, capacity, drop, concurrency, keepdb, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+        try:
+            failures = self.run_check(members, capacity, drop, concurrency)
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+            teardown_test_environment()
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Capacity held on every event'))
+
+    def run_check(self, members, capacity, drop, concurrency):
+        seed_bench(users=members, guilds=1, members_per_guild=members, events_per_guild=2,
+                   rsvp_rate=0, pending_rate=0, prefix='capacity', seed=1)
+        guild = Guild.objects.get(name__startswith='capacity-guild-')
+        events = list(Event.objects.filter(guild=guild).order_by('pk'))
+        Event.objects.filter(guild=guild).update(max_participants=capacity)
+        users = get_user_model().objects.filter(
+            profile__membership__guild=guild, profile__membership__status=Membership.STATUS_APPROVED,
+        )
+        clients = {}
+        for user in users:
+            clients[user.pk] = Client()
+            clients[user.pk].force_login(user)
+        profiles = list(clients)
+
+        # Both events are hit at once so signups on one are seen not to wait
+        # on the other.
+        jobs = [(user_id, event, 'YES') for user_id in profiles for event in events]
+        random.Random(1).shuffle(jobs)
+        self.fire('signup', clients, jobs, concurrency)
+        failures = self.verify(events, capacity, len(profiles))
+
+        for event in events:
+            confirmed = list(RSVP.objects.filter(event=event, response='YES').values_list('profile__user', flat=True))
+            queue = list(
+                RSVP.objects.filter(event=event, response=RSVP.RESPONSE_WAITLIST)
+                .order_by('waitlisted_at', 'pk').values_list('profile__user', flat=True)
+            )
+            leaving = random.Random(2).sample(confirmed, min(drop, len(confirmed)))
+            self.fire(f'dropout {event.pk}', clients, [(user_id, event, 'NO') for user_id in leaving], concurrency)
+            promoted = set(
+                RSVP.objects.filter(event=event, response='YES', profile__user__in=queue).values_list('profile__user', flat=True)
+            )
+            expected = set(queue[:len(leaving)])
+            if promoted != expected:
+                failures.append(f'{event.pk}: promoted {len(promoted)} members out of waitlist order')
+        failures += self.verify(events, capacity, len(profiles), dropped=drop)
+        return failures
+
+    def fire(self, label, clients, jobs, concurrency):
+        def post(job):
+            user_id, event, response = job
+            try:
+                return clients[user_id].post(reverse('rsvp', args=[event.pk]), {'response': response}).status_code < 400
+            except Exception:
+                return False
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(post, jobs))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'  {label:<20} {len(jobs)} requests in {elapsed:6.2f}s '
+            f'({len(jobs) / elapsed:7.1f} req/s)  errors {results.count(False)}'
+        )
+
+    def verify(self, events, capacity, members, dropped=0):
+        failures = []
+        stored = count_rsvps([e.pk for e in events])
+        for event in Event.objects.filter(pk__in=[e.pk for e in events]).annotate(
+            waiting=Count('rsvps', filter=Q(rsvps__response=RSVP.RESPONSE_WAITLIST)),
+        ):
+            counts = stored.get(event.pk, {})
+            self.stdout.write(
+                f'    {event.pk}: {event.count_yes}/{capacity} confirmed, {event.waiting} waitlisted, '
+                f'{event.count_no} declined'
+            )
+            if event.count_yes > capacity:
+                failures.append(f'{event.pk}: {event.count_yes} confirmed over a cap of {capacity}')
+            for field in ('count_yes', 'count_no', 'count_maybe'):
+                if getattr(event, field) != counts.get(field, 0):
+                    failures.append(f'{event.pk}: {field} is {getattr(event, field)} but {counts.get(field, 0)} rows')
+            expected_yes = min(capacity, members - dropped)
+            if event.count_yes != expected_yes:
+                failures.append(f'{event.pk}: {event.count_yes} confirmed, expected {expected_yes}')
+            if event.count_yes + event.waiting + event.count_no != members:
+                failures.append(f'{event.pk}: {members - event.count_yes - event.waiting - event.count_no} signups lost')
+        return failures
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from main_app.models import Guild
+from main_app.transfer import EXPORT_KINDS, EXPORT_FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = 'Stream a guild roster or its RSVPs as CSV or JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('guild_id', type=int)
+        parser.add_argument('--kind', choices=EXPORT_KINDS, default='roster')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write; defaults to stdout.')
+
+    def handle(self, *args, guild_id, kind, format, output=None, **options):
+        try:
+            guild = Guild.objects.get(pk=guild_id)
+        except Guild.DoesNotExist:
+            raise CommandError(f'Guild {guild_id} does not exist.')
+        chunks = export_stream(guild, kind, format)
+        if output:
+            with open(output, 'w', encoding='utf-8', newline='') as fh:
+                fh.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
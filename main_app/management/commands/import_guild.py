@@ -0,0 +1,26 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from main_app.models import Guild
+from main_app.transfer import EXPORT_KINDS, EXPORT_FORMATS, import_stream
+
+
+class Command(BaseCommand):
+    help = 'Import guild roster or RSVP rows from a CSV or JSONL file in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('guild_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--kind', choices=EXPORT_KINDS, default='roster')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, help='Defaults to the file extension.')
+
+    def handle(self, *args, guild_id, path, kind, format=None, **options):
+        try:
+            guild = Guild.objects.get(pk=guild_id)
+        except Guild.DoesNotExist:
+            raise CommandError(f'Guild {guild_id} does not exist.')
+        fmt = format or path.rsplit('.', 1)[-1].lower()
+        if fmt not in EXPORT_FORMATS:
+            raise CommandError(f'Unsupported format {fmt!r}; pass --format.')
+        with open(path, 'rb') as fh:
+            result = import_stream(guild, kind, fmt, fh)
+        self.stdout.write(json.dumps(result.as_dict(), indent=2))
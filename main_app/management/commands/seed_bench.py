@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from main_app.seeding import seed_bench
+
+
+class Command(BaseCommand):
+    help = 'Create synthetic users, guilds, memberships, events and RSVPs with bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--guilds', type=int, default=50)
+        parser.add_argument('--members-per-guild', type=int, default=100)
+        parser.add_argument('--events-per-guild', type=int, default=30)
+        parser.add_argument('--rsvp-rate', type=float, default=0.5, help='Chance each approved member RSVPs to an event.')
+        parser.add_argument('--pending-rate', type=float, default=0.05)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible data.')
+
+    def handle(self, *args, **options):
+        counts = seed_bench(
+            users=options['users'],
+            guilds=options['guilds'],
+            members_per_guild=options['members_per_guild'],
+            events_per_guild=options['events_per_guild'],
+            rsvp_rate=options['rsvp_rate'],
+            pending_rate=options['pending_rate'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{value} {name}' for name, value in counts.items())
+        ))
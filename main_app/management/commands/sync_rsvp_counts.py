@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main_app.models import Event
+from main_app.tallies import COUNTER_FIELDS, count_rsvps, recount_counters
+
+FIELDS = list(COUNTER_FIELDS.values())
+
+
+class Command(BaseCommand):
+    help = 'Check the denormalized RSVP counters on Event against RSVP rows and repair drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, dry_run=False, batch_size=2000, **options):
+        checked = drifted = 0
+        batch = []
+        events = Event.objects.only('pk', *FIELDS).order_by('pk').iterator(chunk_size=batch_size)
+        for event in events:
+            batch.append(event)
+            if len(batch) >= batch_size:
+                drifted += self.repair(batch, dry_run)
+                checked += len(batch)
+                batch = []
+        if batch:
+            drifted += self.repair(batch, dry_run)
+            checked += len(batch)
+
+        verb = 'found' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} events, {verb} {drifted} with drift.'))
+
+    def repair(self, events, dry_run):
+        actual = count_rsvps([e.pk for e in events])
+        stale = []
+        for event in events:
+            counts = actual.get(event.pk, dict.fromkeys(FIELDS, 0))
+            if any(getattr(event, f) != counts[f] for f in FIELDS):
+                self.stdout.write(
+                    f'{event.pk}: '
+                    + ', '.join(f'{f} {getattr(event, f)} -> {counts[f]}' for f in FIELDS)
+                )
+                stale.append(event)
+        if stale and not dry_run:
+            with transaction.atomic():
+                # Recount under row locks so concurrent RSVPs can't slip between
+                # the read above and the write below; taken in pk order, like
+                # every other multi-event lock, so two of them can't deadlock.
+                recount_counters(list(
+                    Event.objects.select_for_update().filter(pk__in=[e.pk for e in stale]).order_by('pk').only('pk')
+                ))
+        return len(stale)
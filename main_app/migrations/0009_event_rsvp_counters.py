@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:36
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    Event = apps.get_model('main_app', 'Event')
+    RSVP = apps.get_model('main_app', 'RSVP')
+    rows = RSVP.objects.values('event').annotate(
+        count_yes=Count('pk', filter=Q(response='YES')),
+        count_no=Count('pk', filter=Q(response='NO')),
+        count_maybe=Count('pk', filter=Q(response='MAYBE')),
+    ).order_by()
+    for row in rows.iterator():
+        Event.objects.filter(pk=row.pop('event')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_profile_avatar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='count_maybe',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='count_no',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='count_yes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_event_rsvp_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['guild', 'start_time'], name='event_guild_start_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0011_storedfile_content_addressed_avatars'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='occurrence_start',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='EventSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=150)),
+                ('description', models.TextField(blank=True)),
+                ('required_roles', models.CharField(blank=True, help_text='Comma-separated list of roles needed', max_length=200)),
+                ('max_participants', models.PositiveIntegerField(blank=True, null=True)),
+                ('starts_at', models.DateTimeField(help_text='First occurrence; later ones keep its time of day')),
+                ('duration', models.DurationField()),
+                ('interval', models.PositiveSmallIntegerField(choices=[(1, 'Weekly'), (2, 'Every two weeks')], default=1)),
+                ('weekdays', models.CharField(blank=True, help_text="Comma-separated weekdays, 0=Monday; blank repeats on the first occurrence's weekday", max_length=20)),
+                ('until', models.DateTimeField(blank=True, null=True)),
+                ('exdates', models.JSONField(blank=True, default=list, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('guild', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='main_app.guild')),
+                ('template', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main_app.eventtemplate')),
+            ],
+            options={
+                'verbose_name_plural': 'event series',
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='main_app.eventseries'),
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.UniqueConstraint(fields=('series', 'occurrence_start'), name='event_series_occurrence_uniq'),
+        ),
+    ]
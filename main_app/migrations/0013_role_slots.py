@@ -0,0 +1,121 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def parse_roles(text):
+    # Frozen copy of main_app.composition.parse_roles.
+    counts = {}
+    for part in (text or '').replace(';', ',').split(','):
+        name, _, count = part.partition(':')
+        name = ' '.join(name.split())[:20]
+        if not name:
+            continue
+        count = count.strip()
+        counts[name] = counts.get(name, 0) + (int(count) if count.isdigit() and int(count) > 0 else 1)
+    return counts
+
+
+def normalize_roles(apps, schema_editor):
+    Role = apps.get_model('main_app', 'Role')
+    Event = apps.get_model('main_app', 'Event')
+    EventTemplate = apps.get_model('main_app', 'EventTemplate')
+    EventRoleSlot = apps.get_model('main_app', 'EventRoleSlot')
+    TemplateRoleSlot = apps.get_model('main_app', 'TemplateRoleSlot')
+    Profile = apps.get_model('main_app', 'Profile')
+    ProfileRole = apps.get_model('main_app', 'ProfileRole')
+    RSVP = apps.get_model('main_app', 'RSVP')
+
+    roles = {role.name.lower(): role for role in Role.objects.all()}
+
+    def role_for(name):
+        key = name.lower()
+        if key not in roles:
+            roles[key] = Role.objects.create(name=name)
+        return roles[key]
+
+    def flush(model, objs):
+        model.objects.bulk_create(objs, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        objs.clear()
+
+    slots = []
+    for pk, text in Event.objects.exclude(required_roles='').values_list('pk', 'required_roles').iterator():
+        for name, required in parse_roles(text).items():
+            slots.append(EventRoleSlot(event_id=pk, role=role_for(name), required=required))
+        if len(slots) >= BATCH_SIZE:
+            flush(EventRoleSlot, slots)
+    flush(EventRoleSlot, slots)
+
+    for pk, text in EventTemplate.objects.exclude(default_roles='').values_list('pk', 'default_roles').iterator():
+        for name, required in parse_roles(text).items():
+            slots.append(TemplateRoleSlot(template_id=pk, role=role_for(name), required=required))
+    flush(TemplateRoleSlot, slots)
+
+    for pk, text in Profile.objects.exclude(preferred_roles='').values_list('pk', 'preferred_roles').iterator():
+        for name in parse_roles(text):
+            slots.append(ProfileRole(profile_id=pk, role=role_for(name)))
+    flush(ProfileRole, slots)
+
+    # RSVPs name a single role; map each distinct string in one UPDATE.
+    for text in RSVP.objects.exclude(role_signed_up='').values_list('role_signed_up', flat=True).distinct():
+        names = list(parse_roles(text))
+        if names:
+            RSVP.objects.filter(role_signed_up=text).update(role=role_for(names[0]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0012_event_series'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rsvp',
+            name='role',
+            field=models.ForeignKey(blank=True, help_text='Role this member plans to fill', null=True, on_delete=django.db.models.deletion.SET_NULL, to='main_app.role'),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='required_roles',
+            field=models.CharField(blank=True, help_text='Roles needed, e.g. Tank:2,Healer:3,DPS:10', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='eventseries',
+            name='required_roles',
+            field=models.CharField(blank=True, help_text='Roles needed, e.g. Tank:2,Healer:3,DPS:10', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='eventtemplate',
+            name='default_roles',
+            field=models.CharField(blank=True, help_text='Roles needed, e.g. Tank:2,Healer:3,DPS:10', max_length=200),
+        ),
+        migrations.CreateModel(
+            name='EventRoleSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('required', models.PositiveSmallIntegerField(default=1)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='role_slots', to='main_app.event')),
+                ('role', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.role')),
+            ],
+            options={
+                'unique_together': {('event', 'role')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TemplateRoleSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('required', models.PositiveSmallIntegerField(default=1)),
+                ('role', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.role')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='role_slots', to='main_app.eventtemplate')),
+            ],
+            options={
+                'unique_together': {('template', 'role')},
+            },
+        ),
+        migrations.RunPython(normalize_roles, migrations.RunPython.noop),
+    ]
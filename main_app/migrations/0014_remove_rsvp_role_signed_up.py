@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:06
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0013_role_slots'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='rsvp',
+            name='role_signed_up',
+        ),
+    ]
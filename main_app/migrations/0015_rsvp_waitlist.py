@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0014_remove_rsvp_role_signed_up'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rsvp',
+            name='waitlisted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='rsvp',
+            name='response',
+            field=models.CharField(choices=[('YES', 'Yes'), ('NO', 'No'), ('MAYBE', 'Maybe'), ('WAIT', 'Waitlisted')], max_length=5),
+        ),
+        migrations.AddIndex(
+            model_name='rsvp',
+            index=models.Index(condition=models.Q(('response', 'WAIT')), fields=['event', 'waitlisted_at'], name='rsvp_waitlist_idx'),
+        ),
+    ]
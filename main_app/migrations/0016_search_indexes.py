@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:02
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+# Frozen copy of main_app.search.SEARCH_KINDS; the indexed expressions must
+# match main_app.search.search_vector exactly.
+SEARCH_KINDS = {
+    'guild': ({'name': 'A', 'description': 'B'}, 'name'),
+    'profile': ({'display_name': 'A', 'main_game': 'B', 'rank': 'C'}, 'display_name'),
+}
+
+
+def _indexes():
+    for model_name, (fields, title) in SEARCH_KINDS.items():
+        vectors = [SearchVector(field, weight=weight, config='simple') for field, weight in fields.items()]
+        vector = vectors[0]
+        for other in vectors[1:]:
+            vector = vector + other
+        yield model_name, GinIndex(vector, name=f'{model_name}_search_idx')
+        yield model_name, GinIndex(fields=[title], opclasses=['gin_trgm_ops'], name=f'{model_name}_{title}_trgm_idx')
+
+
+# Postgres only: other databases search through the in-process index in
+# main_app.search and need nothing here.
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in _indexes():
+        schema_editor.add_index(apps.get_model('main_app', model_name), index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in _indexes():
+        schema_editor.remove_index(apps.get_model('main_app', model_name), index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0015_rsvp_waitlist'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
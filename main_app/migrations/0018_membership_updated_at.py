@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0017_profile_feed_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='membership',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
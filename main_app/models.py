@@ -1,12 +1,14 @@
 import uuid
+from datetime import datetime, timedelta
 from django.conf import settings
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
+from .storage import avatar_storage
 
 class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar = models.ImageField(upload_to='avatars/', storage=avatar_storage, blank=True, null=True)
     display_name = models.CharField(max_length=100)
     rank = models.CharField(max_length=50, blank=True)
     main_game = models.CharField(max_length=100, blank=True)
@@ -16,6 +18,8 @@ class Profile(models.Model):
         choices=[('ACTIVE','Active'), ('INACTIVE','Inactive')],
         default='ACTIVE'
     )
+    # Signed into this profile's calendar feed URLs; bumping it revokes them.
+    feed_version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -64,6 +68,7 @@ class Membership(models.Model):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='RECRUIT')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
     joined_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('guild','profile')
@@ -75,47 +80,195 @@ class EventTemplate(models.Model):
     guild = models.ForeignKey(Guild, on_delete=models.CASCADE, related_name='templates')
     name = models.CharField(max_length=100)
     default_time = models.DurationField(help_text="Default duration, e.g. 2 hours")
-    default_roles = models.CharField(max_length=200, blank=True, help_text="Comma-separated roles: DPS,Healer,Tank")
+    default_roles = models.CharField(max_length=200, blank=True, help_text="Roles needed, e.g. Tank:2,Healer:3,DPS:10")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.guild.name} · {self.name}"
 
+class EventSeries(models.Model):
+    INTERVAL_CHOICES = [
+        (1, 'Weekly'),
+        (2, 'Every two weeks'),
+    ]
+    guild = models.ForeignKey(Guild, on_delete=models.CASCADE, related_name='series')
+    template = models.ForeignKey(EventTemplate, null=True, blank=True, on_delete=models.SET_NULL)
+    title = models.CharField(max_length=150)
+    description = models.TextField(blank=True)
+    required_roles = models.CharField(max_length=200, blank=True, help_text="Roles needed, e.g. Tank:2,Healer:3,DPS:10")
+    max_participants = models.PositiveIntegerField(null=True, blank=True)
+    starts_at = models.DateTimeField(help_text="First occurrence; later ones keep its time of day")
+    duration = models.DurationField()
+    interval = models.PositiveSmallIntegerField(choices=INTERVAL_CHOICES, default=1)
+    weekdays = models.CharField(max_length=20, blank=True, help_text="Comma-separated weekdays, 0=Monday; blank repeats on the first occurrence's weekday")
+    until = models.DateTimeField(null=True, blank=True)
+    # Unix timestamps of occurrences that were cancelled.
+    exdates = models.JSONField(default=list, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'event series'
+
+    def __str__(self):
+        return f"{self.title} ({self.get_interval_display().lower()})"
+
+    def get_absolute_url(self):
+        return reverse('guild-detail', kwargs={'pk': self.guild_id})
+
+    def weekday_set(self):
+        days = {int(d) for d in self.weekdays.split(',') if d.strip().isdigit() and int(d) < 7}
+        return days or {timezone.localtime(self.starts_at).weekday()}
+
+    def occurrence_starts(self, start, end):
+        # Walks only the requested window, so the cost does not depend on
+        # how long the series has been running.
+        first = timezone.localtime(self.starts_at)
+        anchor = first.date() - timedelta(days=first.weekday())
+        weekdays = self.weekday_set()
+        skipped = set(self.exdates)
+        day = max(first.date(), timezone.localtime(start).date())
+        last = timezone.localtime(min(end, self.until) if self.until else end).date()
+        while day <= last:
+            if day.weekday() in weekdays and (day - anchor).days // 7 % self.interval == 0:
+                at = timezone.make_aware(datetime.combine(day, first.time()))
+                if (start <= at < end and at >= self.starts_at
+                        and (self.until is None or at <= self.until)
+                        and int(at.timestamp()) not in skipped):
+                    yield at
+            day += timedelta(days=1)
+
+    def occurrence_at(self, stamp):
+        at = datetime.fromtimestamp(stamp, tz=timezone.get_current_timezone())
+        return next(self.occurrence_starts(at, at + timedelta(seconds=1)), None)
+
+    def build_occurrence(self, start):
+        event = Event(
+            guild_id=self.guild_id,
+            series=self,
+            template_id=self.template_id,
+            title=self.title,
+            description=self.description,
+            start_time=start,
+            end_time=start + self.duration,
+            occurrence_start=start,
+            max_participants=self.max_participants,
+            required_roles=self.required_roles,
+            updated_at=self.updated_at,
+        )
+        if EventSeries.guild.is_cached(self):
+            event.guild = self.guild
+        return event
+
+    def skip(self, start):
+        stamp = int(start.timestamp())
+        if stamp not in self.exdates:
+            self.exdates.append(stamp)
+            self.save(update_fields=['exdates', 'updated_at'])
+
+class EventQuerySet(models.QuerySet):
+    def in_window(self, start, end=None):
+        qs = self.filter(start_time__gte=start)
+        if end is not None:
+            qs = qs.filter(start_time__lt=end)
+        return qs.order_by('start_time')
+
+    def upcoming(self, start=None, end=None):
+        return self.in_window(start or timezone.now(), end)
+
 class Event(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     guild = models.ForeignKey(Guild, on_delete=models.CASCADE, related_name='events')
     template = models.ForeignKey(EventTemplate, null=True, blank=True, on_delete=models.SET_NULL)
+    series = models.ForeignKey(EventSeries, null=True, blank=True, on_delete=models.SET_NULL, related_name='occurrences')
+    occurrence_start = models.DateTimeField(null=True, blank=True, editable=False)
     title = models.CharField(max_length=150)
     description = models.TextField(blank=True)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     max_participants = models.PositiveIntegerField(null=True, blank=True)
-    required_roles = models.CharField(max_length=200, blank=True, help_text="Comma-separated list of roles needed")
+    required_roles = models.CharField(max_length=200, blank=True, help_text="Roles needed, e.g. Tank:2,Healer:3,DPS:10")
+    count_yes = models.PositiveIntegerField(default=0, editable=False)
+    count_no = models.PositiveIntegerField(default=0, editable=False)
+    count_maybe = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['guild', 'start_time'], name='event_guild_start_idx')]
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'occurrence_start'], name='event_series_occurrence_uniq'),
+        ]
+
     def __str__(self):
         return f"{self.title} @ {self.start_time:%b %d, %Y %H:%M}"
 
+    def save(self, *args, **kwargs):
+        # The RSVP counters only move through conditional UPDATEs (see
+        # main_app.capacity); saving a stale instance must not overwrite them.
+        # Deferred fields stay out too, as a plain save would leave them,
+        # except updated_at, which the event page's ETag is built from.
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            skip = {'count_yes', 'count_no', 'count_maybe', *(self.get_deferred_fields() - {'updated_at'})}
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in skip
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def is_full(self):
+        return self.max_participants is not None and self.count_yes >= self.max_participants
+
+    @property
+    def is_virtual(self):
+        # An occurrence expanded from its series that has no row yet.
+        return self._state.adding and self.series_id is not None
+
+    def _url(self, name, occurrence_name):
+        if self.is_virtual:
+            return reverse(occurrence_name, kwargs={'pk': self.series_id, 'stamp': int(self.occurrence_start.timestamp())})
+        return reverse(name, kwargs={'pk': self.pk})
+
     def get_absolute_url(self):
-        return reverse('event-detail', kwargs={'pk': self.pk})
+        return self._url('event-detail', 'occurrence-detail')
+
+    def get_rsvp_url(self):
+        return self._url('rsvp', 'occurrence-rsvp')
+
+    def get_edit_url(self):
+        return self._url('event-update', 'occurrence-edit')
+
+    def get_delete_url(self):
+        return self._url('event-delete', 'occurrence-skip')
 
 class RSVP(models.Model):
+    RESPONSE_WAITLIST = 'WAIT'
     RESPONSE_CHOICES = [
         ('YES','Yes'),
         ('NO','No'),
         ('MAYBE','Maybe'),
+        (RESPONSE_WAITLIST,'Waitlisted'),
     ]
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='rsvps')
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
     response = models.CharField(max_length=5, choices=RESPONSE_CHOICES)
-    role_signed_up = models.CharField(max_length=50, blank=True, help_text="Role this member plans to fill, e.g. DPS")
+    role = models.ForeignKey('Role', null=True, blank=True, on_delete=models.SET_NULL, help_text="Role this member plans to fill")
+    waitlisted_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('event','profile')
+        indexes = [
+            models.Index(
+                fields=['event', 'waitlisted_at'], name='rsvp_waitlist_idx',
+                condition=models.Q(response='WAIT'),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.profile.display_name} → {self.event.title}: {self.get_response_display()}"
@@ -152,4 +305,33 @@ class ProfileRole(models.Model):
         unique_together = ('profile','role')
 
     def __str__(self):
-        return f"{self.profile.display_name}: {self.role.name}"
\ No newline at end of file
+        return f"{self.profile.display_name}: {self.role.name}"
+
+class EventRoleSlot(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='role_slots')
+    role = models.ForeignKey(Role, on_delete=models.CASCADE)
+    required = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('event','role')
+
+    def __str__(self):
+        return f"{self.event.title}: {self.required} × {self.role.name}"
+
+class TemplateRoleSlot(models.Model):
+    template = models.ForeignKey(EventTemplate, on_delete=models.CASCADE, related_name='role_slots')
+    role = models.ForeignKey(Role, on_delete=models.CASCADE)
+    required = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('template','role')
+
+    def __str__(self):
+        return f"{self.template.name}: {self.required} × {self.role.name}"
+
+class StoredFile(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs})"
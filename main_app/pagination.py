@@ -0,0 +1,105 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    # Cursors come back from the client: anything that is not one valid
+    # value per key field counts as no cursor, i.e. the first page.
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        if not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values):
+            return None
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _key_fields(queryset, keys):
+    query = queryset.query.chain()
+    return [query.resolve_ref(key).output_field for key in keys]
+
+
+def _key_value(obj, key):
+    for attr in key.split('__'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _after(keys, values, descending=False):
+    # Lexicographic (k1, k2, ...) > (v1, v2, ...), built as
+    # k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, key in enumerate(keys):
+        term = Q(**{f'{key}__{lookup}': values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            term &= Q(**{prev_key: prev_value})
+        condition |= term
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, keys, has_next, has_previous):
+        self.object_list = object_list
+        self.keys = keys
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _cursor(self, obj):
+        return encode_cursor([_key_value(obj, k) for k in self.keys])
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self._cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self._cursor(self.object_list[0])
+        return None
+
+
+def keyset_paginate(queryset, keys, per_page, after=None, before=None):
+    keys = list(keys)
+    fields = _key_fields(queryset, keys) if after or before else None
+    values = decode_cursor(before, fields) if before else None
+    if values is not None:
+        qs = queryset.order_by(*[f'-{k}' for k in keys]).filter(_after(keys, values, descending=True))
+        rows = list(qs[:per_page + 1])
+        has_more = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], keys, has_next=True, has_previous=has_more)
+
+    values = decode_cursor(after, fields) if after else None
+    qs = queryset.order_by(*keys)
+    if values is not None:
+        qs = qs.filter(_after(keys, values))
+    rows = list(qs[:per_page + 1])
+    has_more = len(rows) > per_page
+    return KeysetPage(rows[:per_page], keys, has_next=has_more, has_previous=values is not None)
@@ -0,0 +1,53 @@
+from functools import cached_property
+from .models import Membership
+
+OFFICER_ROLES = ('LEADER', 'OFFICER')
+
+
+class GuildPermissions:
+    def __init__(self, guild, profile):
+        self.guild = guild
+        self.profile = profile
+
+    def prime(self, membership):
+        self.__dict__['membership'] = membership
+        return self
+
+    @cached_property
+    def membership(self):
+        if self.profile is None:
+            return None
+        return Membership.objects.filter(guild_id=self.guild.pk, profile=self.profile).first()
+
+    @property
+    def is_owner(self):
+        return self.profile is not None and self.guild.owner_id == self.profile.pk
+
+    @property
+    def is_member(self):
+        return self.membership is not None and self.membership.status == Membership.STATUS_APPROVED
+
+    @property
+    def is_officer(self):
+        return self.is_member and self.membership.role in OFFICER_ROLES
+
+    @property
+    def is_pending(self):
+        return self.membership is not None and self.membership.status == Membership.STATUS_PENDING
+
+    @property
+    def can_manage_events(self):
+        return self.is_owner or self.is_officer
+
+    @property
+    def can_schedule_events(self):
+        return self.is_owner or self.is_member
+
+
+def guild_permissions(request, guild, profile=None):
+    cache = request.__dict__.setdefault('_guild_permissions', {})
+    if guild.pk not in cache:
+        if profile is None and request.user.is_authenticated:
+            profile = request.user.profile
+        cache[guild.pk] = GuildPermissions(guild, profile)
+    return cache[guild.pk]
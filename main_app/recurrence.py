@@ -0,0 +1,51 @@
+from datetime import timedelta
+from itertools import islice
+from operator import attrgetter
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from .models import Event
+
+# Open-ended listings ("upcoming") only expand series this far ahead.
+RECURRENCE_HORIZON = timedelta(weeks=getattr(settings, 'RECURRENCE_HORIZON_WEEKS', 8))
+
+
+def active_series(series, start, end):
+    return series.filter(starts_at__lt=end).filter(Q(until__isnull=True) | Q(until__gte=start))
+
+
+def expand_window(events, series, start, end=None, limit=None):
+    horizon = end or start + RECURRENCE_HORIZON
+    rows = events.in_window(start, end)
+    rows = list(rows[:limit] if limit else rows)
+    running = list(active_series(series, start, horizon))
+    if not running:
+        return rows
+
+    # Occurrences that already have a row (possibly moved out of the window
+    # by an edit) must not show up a second time as virtual ones.
+    taken = set(
+        Event.objects.filter(series__in=running, occurrence_start__gte=start, occurrence_start__lt=horizon)
+        .values_list('series_id', 'occurrence_start')
+    )
+    for item in running:
+        virtual = (
+            item.build_occurrence(at) for at in item.occurrence_starts(start, horizon)
+            if (item.pk, at) not in taken
+        )
+        rows.extend(islice(virtual, limit) if limit else virtual)
+    rows.sort(key=attrgetter('start_time'))
+    return rows[:limit] if limit else rows
+
+
+def materialize(series, start):
+    event = Event.objects.filter(series=series, occurrence_start=start).first()
+    if event is not None:
+        return event
+    try:
+        with transaction.atomic():
+            event = series.build_occurrence(start)
+            event.save(force_insert=True)
+            return event
+    except IntegrityError:
+        return Event.objects.get(series=series, occurrence_start=start)
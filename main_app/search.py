@@ -0,0 +1,209 @@
+import bisect
+import heapq
+import re
+import threading
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from .models import Guild, Profile
+from .routers import primary_reads
+
+SEARCH_PER_PAGE = 24
+AUTOCOMPLETE_LIMIT = 8
+
+# kind -> (model, {field: weight}, title field). Weights follow Postgres:
+# A is the strongest.
+SEARCH_KINDS = {
+    'guilds': (Guild, {'name': 'A', 'description': 'B'}, 'name'),
+    'profiles': (Profile, {'display_name': 'A', 'main_game': 'B', 'rank': 'C'}, 'display_name'),
+}
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+
+def search_terms(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def search_vector(kind):
+    # Must stay identical to the expression indexed in migration 0016, or
+    # Postgres falls back to a sequential scan.
+    _, fields, _ = SEARCH_KINDS[kind]
+    vectors = [SearchVector(field, weight=weight, config='simple') for field, weight in fields.items()]
+    vector = vectors[0]
+    for other in vectors[1:]:
+        vector = vector + other
+    return vector
+
+
+class SearchPage:
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def search(kind, text, queryset=None, page=1, per_page=SEARCH_PER_PAGE):
+    model, _, _ = SEARCH_KINDS[kind]
+    queryset = model.objects.all() if queryset is None else queryset
+    terms = search_terms(text)
+    offset = (page - 1) * per_page
+    if not terms:
+        return SearchPage([], page, False)
+    if connections[queryset.db].vendor == 'postgresql':
+        rows = list(ranked_queryset(kind, terms, queryset)[offset:offset + per_page + 1])
+    else:
+        ranked = get_index(kind).search(terms, limit=offset + per_page + 1)[offset:]
+        found = queryset.in_bulk(ranked)
+        rows = [found[pk] for pk in ranked if pk in found]
+    return SearchPage(rows[:per_page], page, len(rows) > per_page)
+
+
+def autocomplete(kind, text, limit=AUTOCOMPLETE_LIMIT):
+    model, _, title = SEARCH_KINDS[kind]
+    terms = search_terms(text)
+    if not terms:
+        return []
+    if connections[model.objects.db].vendor == 'postgresql':
+        return list(ranked_queryset(kind, terms, model.objects.all()).values_list('pk', title)[:limit])
+    index = get_index(kind)
+    return [(pk, index.titles[pk]) for pk in index.search(terms, limit=limit)]
+
+
+def ranked_queryset(kind, terms, queryset):
+    # Every term must match; the last is a prefix so results follow the
+    # user's typing. Trigram similarity on the title catches typos.
+    _, _, title = SEARCH_KINDS[kind]
+    text = ' '.join(terms)
+    query = SearchQuery(' & '.join(terms[:-1] + [f'{terms[-1]}:*']), search_type='raw', config='simple')
+    vector = search_vector(kind)
+    return (
+        queryset.alias(document=vector)
+        .filter(Q(document=query) | Q(**{f'{title}__trigram_similar': text}))
+        .annotate(rank=SearchRank(vector, query) + TrigramSimilarity(title, text))
+        .order_by('-rank', title, 'pk')
+    )
+
+
+class InvertedIndex:
+    # Fallback for databases without full-text search: token -> {pk: score},
+    # plus a sorted vocabulary so prefixes are a bisect away.
+    def __init__(self, fields, rows):
+        self.postings = {}
+        self.titles = {}
+        for pk, title, *values in rows:
+            self.titles[pk] = title or ''
+            for weight, value in zip(fields.values(), values):
+                for token in search_terms(value):
+                    scores = self.postings.setdefault(token, {})
+                    scores[pk] = max(scores.get(pk, 0), WEIGHTS[weight])
+        self.vocabulary = sorted(self.postings)
+        # Ties in score go by title; precomputing that order keeps string
+        # comparisons out of every query.
+        by_title = sorted(self.titles, key=lambda pk: (self.titles[pk].lower(), pk))
+        self.order = {pk: i for i, pk in enumerate(by_title)}
+        self._ranked = {}
+
+    def _prefixed(self, prefix):
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def _best_first(self, token, factor=1):
+        # The token's postings as (-score, title order, pk), best first;
+        # sorted once per token and index.
+        if token not in self._ranked:
+            self._ranked[token] = sorted((-score, self.order[pk], pk) for pk, score in self.postings[token].items())
+        ranked = self._ranked[token]
+        return ranked if factor == 1 else ((score * factor, order, pk) for score, order, pk in ranked)
+
+    def _match(self, term, prefix):
+        scores = self.postings.get(term, {})
+        if prefix:
+            scores = dict(scores)
+            for token in self._prefixed(term):
+                if token != term:
+                    for pk, score in self.postings[token].items():
+                        # A partial word counts for half a whole one.
+                        scores[pk] = max(scores.get(pk, 0), score / 2)
+        return scores
+
+    def _search_one(self, term, prefix, limit):
+        # Merging the per-token lists yields each pk first at its best
+        # score, so a single term stops after `limit` results.
+        streams = [self._best_first(term)] if term in self.postings else []
+        if prefix:
+            streams += [self._best_first(token, 0.5) for token in self._prefixed(term) if token != term]
+        seen = set()
+        for _, _, pk in heapq.merge(*streams):
+            if pk not in seen:
+                seen.add(pk)
+                yield pk
+                if len(seen) == limit:
+                    return
+
+    def search(self, terms, limit=None):
+        if len(terms) == 1:
+            return list(self._search_one(terms[0], True, limit))
+        matches = [self._match(term, i == len(terms) - 1) for i, term in enumerate(terms)]
+        matches.sort(key=len)
+        totals = matches[0]
+        for scores in matches[1:]:
+            totals = {pk: total + scores[pk] for pk, total in totals.items() if pk in scores}
+        key = lambda pk: (-totals[pk], self.order[pk])
+        # Only the requested page needs ordering, not every match.
+        if limit is not None and limit < len(totals):
+            return heapq.nsmallest(limit, totals, key=key)
+        return sorted(totals, key=key)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _version_key(kind):
+    return f'search:{kind}:version'
+
+
+def bump_search_index(kind):
+    try:
+        cache.incr(_version_key(kind))
+    except ValueError:
+        cache.add(_version_key(kind), 2, None)
+
+
+def get_index(kind):
+    # Built on first use in each process and rebuilt after any write
+    # anywhere bumps the shared version.
+    version = cache.get_or_set(_version_key(kind), 1, None)
+    with _indexes_lock:
+        built = _indexes.get(kind)
+        if built is None or built[0] != version:
+            model, fields, title = SEARCH_KINDS[kind]
+            with primary_reads():
+                rows = model.objects.values_list('pk', title, *fields).iterator(chunk_size=5000)
+                built = _indexes[kind] = (version, InvertedIndex(fields, rows))
+    return built[1]
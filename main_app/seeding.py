@@ -0,0 +1,110 @@
+import random
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from .models import Profile, Guild, Membership, Event, EventRoleSlot, RSVP
+from .tallies import COUNTER_FIELDS
+from .composition import parse_roles, resolve_roles
+
+BATCH_SIZE = 2000
+ROLES = ['MEMBER'] * 6 + ['RECRUIT', 'TRIAL', 'OFFICER']
+RESPONSES = list(COUNTER_FIELDS)
+COMPOSITION = 'Tank:2,Healer:4,DPS:14'
+
+
+def _flush(model, objs):
+    if objs:
+        model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+        objs.clear()
+
+
+def seed_bench(users=1000, guilds=50, members_per_guild=100, events_per_guild=30,
+               rsvp_rate=0.5, pending_rate=0.05, prefix='bench', password='bench-pass', seed=None):
+    rng = random.Random(seed)
+    User = get_user_model()
+    now = timezone.now()
+    hashed = make_password(password)
+
+    with transaction.atomic():
+        start = User.objects.filter(username__startswith=f'{prefix}-user-').count()
+        new_users = [
+            User(username=f'{prefix}-user-{i}', password=hashed)
+            for i in range(start, start + users)
+        ]
+        _flush(User, new_users)
+        user_ids = list(
+            User.objects.filter(username__startswith=f'{prefix}-user-')
+            .order_by('pk').values_list('pk', flat=True)[start:start + users]
+        )
+        _flush(Profile, [Profile(user_id=uid, display_name=f'{prefix} player {uid}') for uid in user_ids])
+        profile_ids = list(Profile.objects.filter(user_id__in=user_ids).values_list('pk', flat=True))
+
+        guild_start = Guild.objects.filter(name__startswith=f'{prefix}-guild-').count()
+        _flush(Guild, [
+            Guild(name=f'{prefix}-guild-{i}', description=f'Benchmark guild {i}', owner_id=rng.choice(profile_ids))
+            for i in range(guild_start, guild_start + guilds)
+        ])
+        guild_rows = list(
+            Guild.objects.filter(name__startswith=f'{prefix}-guild-')
+            .order_by('pk').values_list('pk', 'owner_id')[guild_start:guild_start + guilds]
+        )
+
+        slots = parse_roles(COMPOSITION)
+        roles = resolve_roles(slots)
+        role_ids = [role.pk for role in roles.values()]
+
+        memberships, events, slot_rows, rsvps = [], [], [], []
+        for guild_id, owner_id in guild_rows:
+            others = rng.sample(profile_ids, min(members_per_guild, len(profile_ids)))
+            roster = [owner_id] + [pid for pid in others if pid != owner_id]
+            approved = []
+            for pid in roster:
+                if pid == owner_id:
+                    status, role = Membership.STATUS_APPROVED, 'LEADER'
+                elif rng.random() < pending_rate:
+                    status, role = Membership.STATUS_PENDING, 'RECRUIT'
+                else:
+                    status, role = Membership.STATUS_APPROVED, rng.choice(ROLES)
+                memberships.append(Membership(guild_id=guild_id, profile_id=pid, role=role, status=status))
+                if status == Membership.STATUS_APPROVED:
+                    approved.append(pid)
+
+            for _ in range(events_per_guild):
+                start_time = now + timedelta(hours=rng.randint(-24 * 30, 24 * 60))
+                event = Event(
+                    guild_id=guild_id,
+                    title=rng.choice(['Raid night', 'Mythic push', 'Scrims', 'Social hour', 'PvP ladder']),
+                    start_time=start_time,
+                    end_time=start_time + timedelta(hours=2),
+                    required_roles=COMPOSITION,
+                )
+                slot_rows.extend(
+                    EventRoleSlot(event=event, role=roles[name], required=count) for name, count in slots.items()
+                )
+                for pid in approved:
+                    if rng.random() < rsvp_rate:
+                        response = rng.choice(RESPONSES)
+                        field = COUNTER_FIELDS[response]
+                        setattr(event, field, getattr(event, field) + 1)
+                        rsvps.append(RSVP(event=event, profile_id=pid, response=response, role_id=rng.choice(role_ids)))
+                events.append(event)
+
+            if len(memberships) + len(rsvps) >= BATCH_SIZE * 5:
+                _flush(Membership, memberships)
+                _flush(Event, events)
+                _flush(EventRoleSlot, slot_rows)
+                _flush(RSVP, rsvps)
+        _flush(Membership, memberships)
+        _flush(Event, events)
+        _flush(EventRoleSlot, slot_rows)
+        _flush(RSVP, rsvps)
+
+    return {
+        'users': len(user_ids),
+        'guilds': len(guild_rows),
+        'memberships': Membership.objects.filter(guild_id__in=[g for g, _ in guild_rows]).count(),
+        'events': Event.objects.filter(guild_id__in=[g for g, _ in guild_rows]).count(),
+        'rsvps': RSVP.objects.filter(event__guild_id__in=[g for g, _ in guild_rows]).count(),
+    }
@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Profile, Guild, Membership, Event, EventSeries, EventTemplate, RSVP
+from .tallies import recount_counters, shift_counters
+from .capacity import promote_waitlist
+from .caching import bump_guild_cache, bump_profile_cache, forget_viewer
+from .live import schedule_rsvp_publish
+from .composition import sync_event_slots, sync_template_slots, sync_profile_roles
+from .search import bump_search_index
+from .avatars import release_avatar
+
+
+def on_commit(bump, *args):
+    # Caches are invalidated once the write commits, never before: a read in
+    # between would refill them from the old rows. schedule_rsvp_publish
+    # waits for the same reason.
+    transaction.on_commit(lambda: bump(*args))
+
+
+def cascaded(origin):
+    # RSVPs deleted along with their event or profile: the event has gone, or
+    # the profile's handlers below settle each event once, not per RSVP.
+    return origin is not None and not isinstance(origin, RSVP) and getattr(origin, 'model', None) is not RSVP
+
+
+def saved(update_fields, field):
+    # Whether a save may have changed field; a plain save() may change any.
+    return update_fields is None or field in update_fields
+
+
+@receiver(post_delete, sender=RSVP)
+def release_rsvp_counter(sender, instance, origin=None, **kwargs):
+    if cascaded(origin):
+        return
+    shift_counters(instance.event_id, instance.response, None)
+    if instance.response == 'YES':
+        promote_waitlist(instance.event_id)
+
+
+@receiver([post_save, post_delete], sender=RSVP)
+def publish_rsvp_change(sender, instance, origin=None, **kwargs):
+    if not cascaded(origin):
+        schedule_rsvp_publish(instance.event_id)
+
+
+@receiver(pre_delete, sender=Profile)
+def remember_profile_rsvps(sender, instance, **kwargs):
+    instance._rsvp_responses = dict(RSVP.objects.filter(profile=instance).values_list('event_id', 'response'))
+
+
+@receiver(post_delete, sender=Profile)
+def release_profile_rsvps(sender, instance, **kwargs):
+    responses = getattr(instance, '_rsvp_responses', None)
+    if not responses:
+        return
+    # Events deleted in the same cascade are already gone.
+    events = list(Event.objects.select_for_update().filter(pk__in=list(responses)).order_by('pk').only('pk', 'guild_id'))
+    recount_counters(events)
+    for event in events:
+        if responses[event.pk] == 'YES':
+            promote_waitlist(event.pk)
+        schedule_rsvp_publish(event.pk)
+    on_commit(bump_guild_cache, *(event.guild_id for event in events))
+
+
+@receiver(post_delete, sender=Profile)
+def release_profile_avatar(sender, instance, **kwargs):
+    # However the profile goes (its own page, the admin, its user's delete).
+    if instance.avatar:
+        release_avatar(instance.avatar.storage, instance.avatar.name)
+
+
+@receiver([post_save, post_delete], sender=Guild)
+def invalidate_guild(sender, instance, **kwargs):
+    on_commit(bump_guild_cache, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Membership)
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=EventSeries)
+def invalidate_guild_child(sender, instance, **kwargs):
+    on_commit(bump_guild_cache, instance.guild_id)
+
+
+@receiver([post_save, post_delete], sender=Membership)
+def invalidate_member_dashboard(sender, instance, **kwargs):
+    on_commit(bump_profile_cache, instance.profile_id)
+
+
+@receiver([post_save, post_delete], sender=RSVP)
+def invalidate_rsvp_guild(sender, instance, origin=None, **kwargs):
+    if cascaded(origin):
+        return
+    if RSVP._meta.get_field('event').is_cached(instance):
+        guild_id = instance.event.guild_id
+    else:
+        guild_id = Event.objects.filter(pk=instance.event_id).values_list('guild_id', flat=True).first()
+    if guild_id is not None:
+        on_commit(bump_guild_cache, guild_id)
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_guilds(sender, instance, created, **kwargs):
+    if created:
+        return
+    on_commit(
+        bump_guild_cache,
+        *Membership.objects.filter(profile=instance).values_list('guild_id', flat=True),
+        *Guild.objects.filter(owner=instance).values_list('pk', flat=True),
+    )
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    on_commit(forget_viewer, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def forget_cached_profile(sender, instance, **kwargs):
+    on_commit(forget_viewer, instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Guild)
+def reindex_guilds(sender, instance, **kwargs):
+    on_commit(bump_search_index, 'guilds')
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def reindex_profiles(sender, instance, **kwargs):
+    on_commit(bump_search_index, 'profiles')
+
+
+@receiver(post_save, sender=Event)
+def sync_event_role_slots(sender, instance, update_fields=None, **kwargs):
+    if saved(update_fields, 'required_roles'):
+        sync_event_slots(instance)
+
+
+@receiver(post_save, sender=EventTemplate)
+def sync_template_role_slots(sender, instance, update_fields=None, **kwargs):
+    if saved(update_fields, 'default_roles'):
+        sync_template_slots(instance)
+
+
+@receiver(post_save, sender=Profile)
+def sync_preferred_roles(sender, instance, update_fields=None, **kwargs):
+    if saved(update_fields, 'preferred_roles'):
+        sync_profile_roles(instance)
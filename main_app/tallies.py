@@ -0,0 +1,62 @@
+from django.db.models import Count, F, Q
+from .models import Event, RSVP
+
+COUNTER_FIELDS = {
+    'YES': 'count_yes',
+    'NO': 'count_no',
+    'MAYBE': 'count_maybe',
+}
+
+
+def tally_rsvps(events, profile=None):
+    # Counts live on Event (see shift_counters); only the viewer's own RSVPs
+    # still need a lookup, and that is one query for the whole batch.
+    events = list(events)
+    for event in events:
+        event.my_rsvp = None
+    if not events or profile is None:
+        return events
+
+    by_event = {e.pk: e for e in events}
+    for rsvp in RSVP.objects.filter(event__in=list(by_event), profile=profile).select_related('role'):
+        event = by_event[rsvp.event_id]
+        rsvp.event = event
+        rsvp.profile = profile
+        event.my_rsvp = rsvp
+    return events
+
+
+def count_rsvps(event_ids):
+    rows = (
+        RSVP.objects
+        .filter(event__in=event_ids)
+        .values('event')
+        .annotate(
+            count_yes=Count('pk', filter=Q(response='YES')),
+            count_no=Count('pk', filter=Q(response='NO')),
+            count_maybe=Count('pk', filter=Q(response='MAYBE')),
+        )
+        .order_by()
+    )
+    return {row.pop('event'): row for row in rows}
+
+
+def shift_counters(event_id, old, new):
+    if old == new:
+        return
+    changes = {}
+    if old in COUNTER_FIELDS:
+        changes[COUNTER_FIELDS[old]] = F(COUNTER_FIELDS[old]) - 1
+    if new in COUNTER_FIELDS:
+        changes[COUNTER_FIELDS[new]] = F(COUNTER_FIELDS[new]) + 1
+    if changes:
+        Event.objects.filter(pk=event_id).update(**changes)
+
+
+def recount_counters(events):
+    # For writes that bypass shift_counters; call with the events locked.
+    counts = count_rsvps([e.pk for e in events])
+    for event in events:
+        for field, value in counts.get(event.pk, dict.fromkeys(COUNTER_FIELDS.values(), 0)).items():
+            setattr(event, field, value)
+    Event.objects.bulk_update(events, list(COUNTER_FIELDS.values()))
@@ -0,0 +1,25 @@
+from django import template
+from ..avatars import VARIANT_SIZES, variant_name
+
+register = template.Library()
+
+
+def _pick_size(size):
+    return next((s for s in VARIANT_SIZES if s >= size), VARIANT_SIZES[-1])
+
+
+@register.inclusion_tag('profiles/avatar.html')
+def avatar(profile, size=128, css_class='profile-avatar'):
+    ctx = {'profile': profile, 'size': size, 'css_class': css_class}
+    if profile.avatar:
+        field = profile.avatar
+        variant = _pick_size(size)
+        jpg = variant_name(field.name, variant, 'jpg')
+        # Processing runs after the upload commits, so fall back to the
+        # original until the variants exist.
+        if field.storage.exists(jpg):
+            ctx['webp_url'] = field.storage.url(variant_name(field.name, variant, 'webp'))
+            ctx['src'] = field.storage.url(jpg)
+        else:
+            ctx['src'] = field.url
+    return ctx
@@ -1,3 +1,858 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.http import HttpResponse
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from .models import Profile, Guild, Membership, Event, EventRoleSlot, EventSeries, Role, RSVP, StoredFile
+from .asyncdb import parallel
+from .avatars import (
+    MAX_DIMENSION, VARIANT_SIZES, acquire_avatar, process_avatar, release_avatar, render_avatar, variant_names,
+)
+from .backends import CachedModelBackend
+from .caching import guild_cache_version
+from .capacity import apply_response, claim_seat
+from .composition import parse_roles, slot_fill_rates
+from .dashboard import dashboard_feed
+from .ical import feed_token
+from .instrumentation import QueryBudgetExceeded, view_stats
+from .live import LocalBroker, event_channel, get_broker, publish_rsvp_counts, rsvp_stream
+from .permissions import guild_permissions
+from .recurrence import expand_window, materialize
+from .routers import PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, primary_reads
+from .search import InvertedIndex
+from .seeding import seed_bench
+from .storage import ContentAddressedStorage
+from .views import ROSTER_PAGE_SIZE, Home, event_detail_async, rsvp_async
 
-# Create your tests here.
+
+def make_profile(name):
+    return Profile.objects.create(user=User.objects.create_user(name, password='x'), display_name=name)
+
+
+def make_guild(*members, name='Guild'):
+    guild = Guild.objects.create(name=name, owner=make_profile(f'{name}-owner'))
+    for member in members:
+        Membership.objects.create(guild=guild, profile=member, status=Membership.STATUS_APPROVED, role='MEMBER')
+    return guild
+
+
+def make_event(guild, **fields):
+    start = timezone.now() + timedelta(days=1)
+    fields = {'title': 'Raid', 'start_time': start, 'end_time': start + timedelta(hours=2), **fields}
+    return Event.objects.create(guild=guild, **fields)
+
+
+class SignupTests(TestCase):
+    def test_signup_creates_profile_and_logs_in(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'newplayer',
+            'password1': 'a-long-passphrase-42',
+            'password2': 'a-long-passphrase-42',
+        })
+        self.assertRedirects(response, reverse('profile-detail'))
+        profile = Profile.objects.get(user__username='newplayer')
+        self.assertEqual(profile.display_name, 'newplayer')
+        self.assertEqual(self.client.get(reverse('profile-detail')).context['user'].pk, profile.user_id)
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class WaitlistTests(TestCase):
+    def setUp(self):
+        owner = make_profile('owner')
+        self.guild = Guild.objects.create(name='Guild', owner=owner)
+        self.members = [make_profile(f'member{i}') for i in range(3)]
+        for member in self.members:
+            Membership.objects.create(guild=self.guild, profile=member, status='APPROVED')
+        self.event = make_event(self.guild, max_participants=1)
+
+    def answer(self, member, response):
+        self.client.force_login(member.user)
+        return self.client.post(reverse('rsvp', args=[self.event.pk]), {'response': response})
+
+    def responses(self):
+        return dict(RSVP.objects.filter(event=self.event).values_list('profile__display_name', 'response'))
+
+    def test_giving_up_a_seat_promotes_the_front_of_the_queue(self):
+        for member in self.members:
+            self.answer(member, 'YES')
+        self.assertEqual(self.responses(), {'member0': 'YES', 'member1': 'WAIT', 'member2': 'WAIT'})
+
+        # Over its query budget, the view would raise here.
+        self.answer(self.members[0], 'NO')
+        self.assertEqual(self.responses(), {'member0': 'NO', 'member1': 'YES', 'member2': 'WAIT'})
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.count_yes, self.event.count_no), (1, 1))
+
+    def test_asking_again_keeps_the_place_in_the_queue(self):
+        for member in self.members:
+            self.answer(member, 'YES')
+        Event.objects.filter(pk=self.event.pk).update(max_participants=2)
+        self.answer(self.members[2], 'YES')
+        self.assertEqual(self.responses(), {'member0': 'YES', 'member1': 'YES', 'member2': 'WAIT'})
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SQLite serializes every write, so nothing races')
+class ConcurrentRSVPTests(TransactionTestCase):
+    capacity = 5
+
+    def setUp(self):
+        owner = make_profile('owner')
+        guild = Guild.objects.create(name='Guild', owner=owner)
+        self.members = [make_profile(f'member{i}') for i in range(30)]
+        Membership.objects.bulk_create(
+            Membership(guild=guild, profile=member, status='APPROVED') for member in self.members
+        )
+        self.event = make_event(guild, max_participants=self.capacity)
+
+    def hammer(self, func, args):
+        def run(arg):
+            try:
+                return func(arg)
+            finally:
+                connection.close()
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            return list(pool.map(run, args))
+
+    def answer(self, member, response):
+        # What save_rsvp does once the form is valid.
+        with transaction.atomic():
+            Event.objects.select_for_update().only('pk').get(pk=self.event.pk)
+            rsvp, _ = RSVP.objects.select_for_update().get_or_create(event=self.event, profile=member)
+            previous, rsvp.response = rsvp.response, response
+            apply_response(rsvp, previous)
+
+    def test_claim_seat_never_overfills(self):
+        taken = self.hammer(lambda _: claim_seat(self.event.pk, None), range(30))
+        self.event.refresh_from_db()
+        self.assertEqual(taken.count(True), self.capacity)
+        self.assertEqual(self.event.count_yes, self.capacity)
+
+    def test_waitlist_fills_and_promotes_in_order(self):
+        self.hammer(lambda member: self.answer(member, 'YES'), self.members)
+        self.event.refresh_from_db()
+        self.assertLessEqual(self.event.count_yes, self.event.max_participants)
+        self.assertEqual(RSVP.objects.filter(event=self.event, response='YES').count(), self.capacity)
+        queue = list(
+            RSVP.objects.filter(event=self.event, response=RSVP.RESPONSE_WAITLIST)
+            .order_by('waitlisted_at', 'pk').values_list('profile_id', flat=True)
+        )
+        self.assertEqual(len(queue), len(self.members) - self.capacity)
+
+        leaving = [
+            rsvp.profile for rsvp in
+            RSVP.objects.filter(event=self.event, response='YES').select_related('profile')[:3]
+        ]
+        self.hammer(lambda member: self.answer(member, 'NO'), leaving)
+        self.event.refresh_from_db()
+        promoted = set(
+            RSVP.objects.filter(event=self.event, response='YES', profile_id__in=queue).values_list('profile_id', flat=True)
+        )
+        self.assertEqual(promoted, set(queue[:3]))
+        self.assertEqual((self.event.count_yes, self.event.count_no), (self.capacity, 3))
+
+
+class TallyTests(TestCase):
+    def setUp(self):
+        self.members = [make_profile(f'member{i}') for i in range(3)]
+        self.event = make_event(make_guild(*self.members))
+
+    def test_event_page_counts_answers_and_shows_the_viewers_own(self):
+        for member, response in zip(self.members, ('YES', 'NO', 'MAYBE')):
+            self.client.force_login(member.user)
+            self.client.post(reverse('rsvp', args=[self.event.pk]), {'response': response})
+
+        response = self.client.get(reverse('event-detail', args=[self.event.pk]))
+        counts = [response.context[key] for key in ('count_yes', 'count_no', 'count_maybe')]
+        self.assertEqual(counts, [1, 1, 1])
+        self.assertEqual(response.context['my_response'], 'MAYBE')
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.members = [make_profile(f'member{i}') for i in range(3)]
+        self.event = make_event(make_guild(*self.members))
+        for member in self.members:
+            self.client.force_login(member.user)
+            self.client.post(reverse('rsvp', args=[self.event.pk]), {'response': 'YES'})
+
+    def counts(self):
+        self.event.refresh_from_db()
+        return self.event.count_yes, self.event.count_no, self.event.count_maybe
+
+    def test_changed_and_deleted_answers_move_the_counters(self):
+        self.client.post(reverse('rsvp', args=[self.event.pk]), {'response': 'NO'})
+        self.assertEqual(self.counts(), (2, 1, 0))
+        RSVP.objects.get(event=self.event, profile=self.members[0]).delete()
+        self.assertEqual(self.counts(), (1, 1, 0))
+
+    def test_deleting_a_profile_releases_its_answers(self):
+        self.members[1].delete()
+        self.assertEqual(self.counts(), (2, 0, 0))
+
+    def test_sync_rsvp_counts_repairs_drift(self):
+        Event.objects.filter(pk=self.event.pk).update(count_yes=7, count_maybe=2)
+        call_command('sync_rsvp_counts', stdout=StringIO())
+        self.assertEqual(self.counts(), (3, 0, 0))
+
+
+class PermissionTests(TestCase):
+    def setUp(self):
+        self.member, self.officer, self.applicant = (make_profile(name) for name in ('member', 'officer', 'applicant'))
+        self.guild = make_guild(self.member, self.officer)
+        Membership.objects.filter(profile=self.officer).update(role='OFFICER')
+        Membership.objects.create(guild=self.guild, profile=self.applicant)
+
+    def perms(self, profile):
+        request = RequestFactory().get('/')
+        request.user = profile.user
+        return guild_permissions(request, self.guild, profile)
+
+    def test_roles(self):
+        owner = self.perms(self.guild.owner)
+        member, officer, applicant = self.perms(self.member), self.perms(self.officer), self.perms(self.applicant)
+        self.assertTrue(owner.can_manage_events and officer.can_manage_events)
+        self.assertTrue(member.can_schedule_events)
+        self.assertFalse(member.can_manage_events)
+        self.assertTrue(applicant.is_pending)
+        self.assertFalse(applicant.can_schedule_events)
+
+    def test_resolved_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.officer.user
+        with self.assertNumQueries(1):
+            perms = guild_permissions(request, self.guild, self.officer)
+            self.assertTrue(perms.is_member and perms.is_officer and perms.can_manage_events)
+            self.assertIs(guild_permissions(request, self.guild), perms)
+
+
+class GuildListTests(TestCase):
+    def setUp(self):
+        self.viewer = make_profile('viewer')
+        self.guilds = [make_guild(name=f'guild{i:02}') for i in range(30)]
+        Membership.objects.create(guild=self.guilds[3], profile=self.viewer)
+        self.client.force_login(self.viewer.user)
+
+    def names(self, response):
+        return [guild.name for guild in response.context['guilds']]
+
+    def test_pages_follow_the_cursor(self):
+        first = self.client.get(reverse('guild-list'))
+        self.assertEqual(self.names(first), [f'guild{i:02}' for i in range(24)])
+        self.assertEqual(first.context['joined_guild_ids'], {self.guilds[3].pk})
+        second = self.client.get(reverse('guild-list'), {'after': first.context['page_obj'].next_cursor})
+        self.assertEqual(self.names(second), [f'guild{i:02}' for i in range(24, 30)])
+        self.assertFalse(second.context['page_obj'].has_next())
+
+    def test_malformed_cursor_is_the_first_page(self):
+        for cursor in ('not-base64!', 'WzEsMl0', 'eyJhIjoxfQ'):
+            response = self.client.get(reverse('guild-list'), {'after': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.names(response)[0], 'guild00')
+
+
+class RosterTests(TestCase):
+    def setUp(self):
+        self.members = [make_profile(f'member{i:02}') for i in range(ROSTER_PAGE_SIZE + 5)]
+        self.guild = make_guild(*self.members)
+        Membership.objects.filter(profile=self.members[-1]).update(role='OFFICER')
+        self.client.force_login(self.members[0].user)
+
+    def test_officers_first_then_paged_by_name(self):
+        first = self.client.get(reverse('guild-roster', args=[self.guild.pk]))
+        page = first.context['roster_page']
+        names = [m.profile.display_name for m in page]
+        self.assertEqual(names[:2], [self.members[-1].display_name, 'member00'])
+        self.assertEqual(len(names), ROSTER_PAGE_SIZE)
+
+        second = self.client.get(reverse('guild-roster', args=[self.guild.pk]), {'after': page.next_cursor})
+        rest = [m.profile.display_name for m in second.context['roster_page']]
+        self.assertEqual(len(names) + len(rest), len(self.members))
+        self.assertFalse(set(names) & set(rest))
+
+
+class UpcomingEventTests(TestCase):
+    def test_upcoming_is_the_window_in_start_order(self):
+        guild = make_guild()
+        now = timezone.now()
+        for title, days in (('later', 9), ('past', -1), ('soon', 1), ('next', 3)):
+            start = now + timedelta(days=days)
+            Event.objects.create(guild=guild, title=title, start_time=start, end_time=start + timedelta(hours=1))
+        self.assertEqual([e.title for e in Event.objects.upcoming()], ['soon', 'next', 'later'])
+        self.assertEqual([e.title for e in guild.events.upcoming(end=now + timedelta(days=5))], ['soon', 'next'])
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        self.member, self.outsider = make_profile('member'), make_profile('outsider')
+        self.guild = make_guild(self.member)
+        make_event(self.guild, title='Raid night')
+
+    def guild_feed(self, profile):
+        return reverse('guild-calendar', kwargs={'pk': self.guild.pk, 'token': feed_token('guild', self.guild.pk, profile)})
+
+    def profile_feed(self, profile):
+        return reverse('profile-calendar', kwargs={'pk': profile.pk, 'token': feed_token('profile', profile.pk, profile)})
+
+    def body(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_only_members_and_the_owner_can_read_the_guild_feed(self):
+        response = self.client.get(self.guild_feed(self.member))
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertIn('SUMMARY:Raid night', self.body(response))
+        self.assertEqual(self.client.get(self.guild_feed(self.guild.owner)).status_code, 200)
+        self.assertEqual(self.client.get(self.guild_feed(self.outsider)).status_code, 404)
+
+        url = self.guild_feed(self.member)
+        Membership.objects.filter(profile=self.member).delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_profile_feed_covers_owned_guilds_and_is_bound_to_its_profile(self):
+        self.assertIn('SUMMARY:Raid night', self.body(self.client.get(self.profile_feed(self.guild.owner))))
+        foreign = reverse('profile-calendar', kwargs={
+            'pk': self.member.pk, 'token': feed_token('profile', self.member.pk, self.outsider),
+        })
+        self.assertEqual(self.client.get(foreign).status_code, 404)
+
+    def test_resetting_revokes_old_links(self):
+        old = self.guild_feed(self.member)
+        self.client.force_login(self.member.user)
+        self.client.post(reverse('calendar-reset'))
+        self.member.refresh_from_db()
+        self.assertEqual(self.client.get(old).status_code, 404)
+        self.assertEqual(self.client.get(self.guild_feed(self.member)).status_code, 200)
+
+    def test_unchanged_feed_is_not_modified(self):
+        url = self.guild_feed(self.member)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        make_event(self.guild, title='Another raid')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+def make_image(fmt, size=(300, 200)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class AvatarRenderTests(TestCase):
+    def test_keeps_web_formats_and_falls_back_to_png(self):
+        for fmt, expected in (('JPEG', 'JPEG'), ('PNG', 'PNG'), ('GIF', 'PNG')):
+            with self.subTest(fmt=fmt):
+                original, written, _ = render_avatar(make_image(fmt))
+                self.assertEqual(written, expected)
+                self.assertEqual(Image.open(BytesIO(original)).format, expected)
+
+    def test_shrinks_the_original_and_crops_square_variants(self):
+        original, _, variants = render_avatar(make_image('PNG', (MAX_DIMENSION * 2, MAX_DIMENSION)))
+        self.assertEqual(Image.open(BytesIO(original)).size, (MAX_DIMENSION, MAX_DIMENSION // 2))
+        self.assertEqual(set(variants), {(size, ext) for size in VARIANT_SIZES for ext in ('webp', 'jpg')})
+        for (size, ext), data in variants.items():
+            self.assertEqual(Image.open(BytesIO(data)).size, (size, size))
+
+
+class AvatarStorageTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.storage.save('avatars/one.png', ContentFile(make_image('PNG')))
+        second = self.storage.save('avatars/two.png', ContentFile(make_image('PNG')))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, self.storage.save('avatars/three.png', ContentFile(make_image('JPEG'))))
+
+    def test_files_outlive_all_but_the_last_reference(self):
+        name = self.storage.save('avatars/one.png', ContentFile(make_image('PNG')))
+        acquire_avatar(name)
+        acquire_avatar(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            release_avatar(self.storage, name)
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 1)
+        self.assertTrue(self.storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            release_avatar(self.storage, name)
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(self.storage.exists(name))
+
+    def test_processing_swaps_in_the_rendered_file(self):
+        profile = make_profile('player')
+        upload = self.storage.save('avatars/photo.png', ContentFile(make_image('JPEG')))
+        Profile.objects.filter(pk=profile.pk).update(avatar=upload)
+        acquire_avatar(upload)
+        with self.captureOnCommitCallbacks(execute=True):
+            process_avatar(self.storage, profile.pk, upload)
+        profile.refresh_from_db()
+        self.assertTrue(profile.avatar.name.endswith('.jpg'))
+        self.assertEqual(list(StoredFile.objects.values_list('name', 'refs')), [(profile.avatar.name, 1)])
+        self.assertFalse(self.storage.exists(upload))
+        self.assertTrue(all(self.storage.exists(name) for name in variant_names(profile.avatar.name)))
+
+
+class GuildCacheTests(TestCase):
+    def setUp(self):
+        self.guild = make_guild()
+        Guild.objects.filter(pk=self.guild.pk).update(description='Weekly raids')
+        self.client.force_login(self.guild.owner.user)
+
+    def test_version_moves_only_once_the_write_commits(self):
+        version = guild_cache_version(self.guild.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Membership.objects.create(guild=self.guild, profile=make_profile('member'), status=Membership.STATUS_PENDING)
+            self.assertEqual(guild_cache_version(self.guild.pk), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(guild_cache_version(self.guild.pk), version)
+
+    def test_cached_fragments_follow_the_rows_they_show(self):
+        url = reverse('guild-detail', kwargs={'pk': self.guild.pk})
+        self.assertContains(self.client.get(url), 'Guild-owner')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guild.owner.display_name = 'Renamed'
+            self.guild.owner.save()
+        self.assertContains(self.client.get(url), 'Renamed')
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        # Feeds are keyed by profile pk, which rolled-back tests reuse.
+        cache.clear()
+        self.profile = make_profile('player')
+        self.guild = make_guild(self.profile)
+
+    def titles(self):
+        return [event['title'] for event in dashboard_feed(self.profile)['events']]
+
+    def test_repeat_reads_come_from_the_cache(self):
+        make_event(self.guild)
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard_feed(self.profile)
+        with self.assertNumQueries(0):
+            self.assertEqual([event['title'] for event in dashboard_feed(self.profile)['events']], ['Raid'])
+
+    def test_feed_follows_memberships_and_events(self):
+        self.assertEqual(self.titles(), [])
+        other = Guild.objects.create(name='Other', owner=make_profile('other-owner'))
+        with self.captureOnCommitCallbacks(execute=True):
+            membership = Membership.objects.create(guild=other, profile=self.profile, status=Membership.STATUS_PENDING)
+        self.assertEqual([guild['name'] for guild in dashboard_feed(self.profile)['guilds']], ['Guild'])
+        with self.captureOnCommitCallbacks(execute=True):
+            membership.status = Membership.STATUS_APPROVED
+            membership.save()
+            make_event(other, title='Dungeon')
+        self.assertEqual([guild['name'] for guild in dashboard_feed(self.profile)['guilds']], ['Guild', 'Other'])
+        self.assertEqual(self.titles(), ['Dungeon'])
+
+
+class MembershipBulkTests(TestCase):
+    def setUp(self):
+        self.member = make_profile('member')
+        self.guild = make_guild(self.member)
+        self.pending = [
+            Membership.objects.create(guild=self.guild, profile=make_profile(f'applicant-{n}'), status=Membership.STATUS_PENDING)
+            for n in range(3)
+        ]
+        self.url = reverse('membership-bulk', kwargs={'pk': self.guild.pk})
+
+    def statuses(self):
+        return dict(Membership.objects.filter(guild=self.guild).values_list('pk', 'status'))
+
+    def test_approves_the_selected_requests(self):
+        self.client.force_login(self.guild.owner.user)
+        chosen = [self.pending[0].pk, self.pending[2].pk]
+        self.client.post(self.url, {'action': 'approve', 'mids': chosen})
+        statuses = self.statuses()
+        self.assertEqual([statuses[m.pk] for m in self.pending], ['APPROVED', 'PENDING', 'APPROVED'])
+
+    def test_rejects_every_pending_request(self):
+        self.client.force_login(self.guild.owner.user)
+        self.client.post(self.url, {'action': 'reject', 'all': '1'})
+        self.assertEqual(list(self.statuses().values()), ['APPROVED'])
+
+    def test_members_may_not_manage(self):
+        self.client.force_login(self.member.user)
+        response = self.client.post(self.url, {'action': 'approve', 'all': '1'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(list(self.statuses().values()).count('PENDING'), 3)
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.member, self.outsider = make_profile('member'), make_profile('outsider')
+        self.guild = make_guild(self.member)
+        self.event = make_event(self.guild, max_participants=1)
+        self.client.force_login(self.guild.owner.user)
+
+    def upload(self, kind, lines, encoding='utf-8'):
+        upload = SimpleUploadedFile(f'{kind}.csv', '\n'.join(lines).encode(encoding))
+        url = reverse('guild-import', kwargs={'pk': self.guild.pk, 'kind': kind})
+        return self.client.post(url, {'file': upload}).json()
+
+    def test_roster_export_streams_csv(self):
+        url = reverse('guild-export', kwargs={'pk': self.guild.pk, 'kind': 'roster', 'fmt': 'csv'})
+        lines = b''.join(self.client.get(url).streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'username,display_name,role,status,joined_at')
+        self.assertTrue(lines[1].startswith('member,member,MEMBER,APPROVED,'))
+
+    def test_roster_import_reports_bad_rows(self):
+        result = self.upload('roster', ['username,role', 'outsider,officer', 'nobody,member', 'member,emperor'])
+        self.assertEqual((result['created'], result['updated'], result['skipped']), (1, 0, 2))
+        self.assertEqual(result['errors'], ["line 3: unknown user 'nobody'", "line 4: invalid role 'EMPEROR'"])
+        self.assertEqual(Membership.objects.get(profile=self.outsider).role, 'OFFICER')
+
+    def test_rsvp_import_respects_membership_and_capacity(self):
+        late = make_profile('late')
+        Membership.objects.create(guild=self.guild, profile=late, status=Membership.STATUS_APPROVED)
+        result = self.upload('rsvps', [
+            'event_id,username,response',
+            f'{self.event.pk},member,yes',
+            f'{self.event.pk},late,yes',
+            f'{self.event.pk},outsider,yes',
+            f'{self.event.pk},caf\xe9,yes',
+        ], encoding='latin-1')
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(result['errors'], [
+            "line 4: 'outsider' is not an approved member of this guild",
+            'line 5: unreadable row (files must be UTF-8 CSV or JSON lines)',
+        ])
+        responses = dict(RSVP.objects.values_list('profile__display_name', 'response'))
+        self.assertEqual(responses, {'member': 'YES', 'late': RSVP.RESPONSE_WAITLIST})
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.count_yes, 1)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        view_stats.reset()
+        self.guild = make_guild(make_profile('member'))
+        self.client.force_login(self.guild.owner.user)
+
+    @override_settings(PERF_HEADERS=True)
+    def test_reports_queries_per_view(self):
+        response = self.client.get(reverse('home'))
+        summary = view_stats.summary()['home']
+        self.assertEqual(summary['requests'], 1)
+        self.assertEqual(int(response['X-Query-Count']), summary['queries']['max'])
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_views_over_budget_raise(self):
+        with mock.patch.object(Home, 'query_budget', 1), self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('home'))
+
+    @override_settings(PERF_HEADERS=True)
+    def test_streamed_bodies_are_counted_once_sent(self):
+        url = reverse('guild-export', kwargs={'pk': self.guild.pk, 'kind': 'roster', 'fmt': 'csv'})
+        response = self.client.get(url)
+        self.assertNotIn('guild-export', view_stats.summary())
+        b''.join(response.streaming_content)
+        # The header only covers what ran before the first byte.
+        self.assertGreater(view_stats.summary()['guild-export']['queries']['max'], int(response['X-Query-Count']))
+
+
+class SeedTests(TestCase):
+    def test_seeds_consistent_data_and_appends_on_rerun(self):
+        sizes = dict(users=20, guilds=3, members_per_guild=10, events_per_guild=4, seed=1)
+        first = seed_bench(**sizes)
+        self.assertEqual((first['users'], first['guilds'], first['events']), (20, 3, 12))
+        self.assertEqual(first['memberships'], Membership.objects.count())
+        self.assertEqual(first['rsvps'], RSVP.objects.count())
+        drifted = Event.objects.annotate(yes=Count('rsvps', filter=Q(rsvps__response='YES'))).exclude(count_yes=F('yes'))
+        self.assertFalse(drifted.exists())
+
+        seed_bench(**sizes)
+        self.assertEqual(Profile.objects.count(), 40)
+        self.assertEqual(Guild.objects.count(), 6)
+
+
+class AsyncViewTests(TransactionTestCase):
+    # Each parallel() callable runs on its own connection, which only sees
+    # committed rows.
+    def setUp(self):
+        self.member = make_profile('member')
+        self.guild = make_guild(self.member)
+        self.event = make_event(self.guild, title='Raid night')
+
+    def request(self, method, path, data=None):
+        request = getattr(AsyncRequestFactory(), method)(path, data)
+
+        async def auser():
+            return self.member.user
+        request.auser = auser
+        request.session = self.client.session
+        return request
+
+    def test_parallel_returns_results_in_order(self):
+        results = async_to_sync(parallel)(
+            lambda: Guild.objects.count(),
+            lambda: Event.objects.values_list('title', flat=True).get(),
+        )
+        self.assertEqual(results, [1, 'Raid night'])
+
+    def test_event_page_and_rsvp(self):
+        path = reverse('event-detail', kwargs={'pk': self.event.pk})
+        response = async_to_sync(event_detail_async)(self.request('get', path), pk=self.event.pk)
+        self.assertContains(response, 'Raid night')
+
+        path = reverse('rsvp', kwargs={'pk': self.event.pk})
+        response = async_to_sync(rsvp_async)(self.request('post', path, {'response': 'YES'}), pk=self.event.pk)
+        self.assertEqual(response.status_code, 302)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.count_yes, 1)
+
+
+class LiveCountTests(TransactionTestCase):
+    def setUp(self):
+        self.member = make_profile('member')
+        self.event = make_event(make_guild(self.member))
+
+    async def test_broker_keeps_only_the_newest_message(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe('channel')
+        broker.publish('channel', 1)
+        broker.publish('channel', 2)
+        self.assertEqual(await subscription.get(1), 2)
+        self.assertIsNone(await subscription.get(0.01))
+        broker.unsubscribe('channel', subscription)
+        self.assertFalse(broker.has_subscribers('channel'))
+
+    async def test_stream_sends_a_snapshot_then_updates(self):
+        stream = rsvp_stream(self.event.pk)
+        self.assertTrue((await anext(stream)).startswith('retry: '))
+        self.assertIn('"count_yes": 0', await anext(stream))
+        await RSVP.objects.acreate(event=self.event, profile=self.member, response='YES')
+        await Event.objects.filter(pk=self.event.pk).aupdate(count_yes=1)
+        await sync_to_async(publish_rsvp_counts)(self.event.pk)
+        update = await anext(stream)
+        await stream.aclose()
+        self.assertTrue(update.startswith('event: rsvp\n'))
+        self.assertIn('"count_yes": 1', update)
+        self.assertFalse(get_broker().has_subscribers(event_channel(self.event.pk)))
+
+
+class RecurrenceTests(TestCase):
+    def setUp(self):
+        self.member = make_profile('member')
+        self.guild = make_guild(self.member)
+        self.now = timezone.now()
+        self.series = EventSeries.objects.create(
+            guild=self.guild, title='Weekly raid', starts_at=self.now + timedelta(days=1), duration=timedelta(hours=2),
+        )
+
+    def upcoming(self, **kwargs):
+        return expand_window(
+            Event.objects.filter(guild=self.guild), EventSeries.objects.filter(guild=self.guild),
+            self.now, self.now + timedelta(weeks=3), **kwargs,
+        )
+
+    def test_expands_only_the_window(self):
+        starts = [event.start_time for event in self.upcoming()]
+        self.assertEqual(starts, [self.series.starts_at + timedelta(weeks=n) for n in range(3)])
+        self.assertFalse(Event.objects.exists())
+
+    def test_materialized_and_skipped_occurrences_are_not_repeated(self):
+        first, second, third = (event.start_time for event in self.upcoming())
+        moved = materialize(self.series, first)
+        self.assertEqual(materialize(self.series, first), moved)
+        moved.start_time = third + timedelta(hours=1)
+        moved.save()
+        self.series.skip(second)
+        self.assertEqual([(event.start_time, event.is_virtual) for event in self.upcoming()], [
+            (third, True), (moved.start_time, False),
+        ])
+        self.assertEqual(len(self.upcoming(limit=1)), 1)
+
+    def test_rsvp_to_a_virtual_occurrence_creates_it(self):
+        start = self.series.starts_at
+        self.client.force_login(self.member.user)
+        url = reverse('occurrence-rsvp', kwargs={'pk': self.series.pk, 'stamp': int(start.timestamp())})
+        self.client.post(url, {'response': 'YES'})
+        event = Event.objects.get(series=self.series)
+        self.assertEqual(event.occurrence_start, start)
+        self.assertEqual(event.count_yes, 1)
+
+
+class CompositionTests(TestCase):
+    def setUp(self):
+        self.member = make_profile('member')
+        self.event = make_event(make_guild(self.member), required_roles='Tank:2, Healer')
+
+    def slots(self):
+        return dict(EventRoleSlot.objects.filter(event=self.event).values_list('role__name', 'required'))
+
+    def test_parse_roles(self):
+        self.assertEqual(parse_roles('Tank:2; healer , Tank, DPS:x'), {'Tank': 3, 'healer': 1, 'DPS': 1})
+
+    def test_slots_follow_required_roles(self):
+        self.assertEqual(self.slots(), {'Tank': 2, 'Healer': 1})
+        self.event.required_roles = 'tank:1,DPS:5'
+        self.event.save()
+        self.assertEqual(self.slots(), {'Tank': 1, 'DPS': 5})
+
+    def test_saves_of_other_fields_leave_slots_alone(self):
+        EventRoleSlot.objects.filter(event=self.event).delete()
+        self.event.title = 'Renamed'
+        self.event.save(update_fields=['title'])
+        self.assertEqual(self.slots(), {})
+
+    def test_fill_rates_count_yes_answers_per_role(self):
+        tank = Role.objects.get(name='Tank')
+        RSVP.objects.create(event=self.event, profile=self.member, response='YES', role=tank)
+        RSVP.objects.create(event=self.event, profile=self.event.guild.owner, response='MAYBE', role=tank)
+        self.assertEqual(slot_fill_rates([self.event.pk])[self.event.pk], [
+            {'role': 'Healer', 'required': 1, 'filled': 0, 'open': 1},
+            {'role': 'Tank', 'required': 2, 'filled': 1, 'open': 1},
+        ])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        # The fallback index is versioned in the cache, which outlives the
+        # rows of earlier tests.
+        cache.clear()
+        self.viewer = make_profile('viewer')
+        self.client.force_login(self.viewer.user)
+
+    def test_index_ranks_titles_first_and_matches_prefixes(self):
+        index = InvertedIndex({'name': 'A', 'description': 'B'}, [
+            (1, 'Night Raiders', 'Night Raiders', 'casual'),
+            (2, 'Dawn', 'Dawn', 'night raiders welcome'),
+            (3, 'Nightfall', 'Nightfall', 'hardcore raiders'),
+        ])
+        # A partial word in the title beats a whole one in the description.
+        self.assertEqual(index.search(['night']), [1, 3, 2])
+        self.assertEqual(index.search(['raiders', 'night']), [1, 3, 2])
+        self.assertEqual(index.search(['hardcore', 'raid']), [3])
+
+    def test_profile_search_and_autocomplete(self):
+        for name in ('Tankmaster', 'Tanky', 'Healbot'):
+            make_profile(name)
+        response = self.client.get(reverse('profile-search'), {'q': 'tank'})
+        self.assertEqual([p.display_name for p in response.context['profiles']], ['Tankmaster', 'Tanky'])
+        response = self.client.get(reverse('search-autocomplete', kwargs={'kind': 'profiles'}), {'q': 'heal'})
+        self.assertEqual([r['label'] for r in response.json()['results']], ['Healbot'])
+
+    def test_index_follows_committed_writes(self):
+        self.client.get(reverse('profile-search'), {'q': 'tank'})
+        with self.captureOnCommitCallbacks(execute=True):
+            make_profile('Tankmaster')
+        response = self.client.get(reverse('profile-search'), {'q': 'tank'})
+        self.assertEqual([p.display_name for p in response.context['profiles']], ['Tankmaster'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, request):
+        def view(request):
+            response = HttpResponse()
+            response.db = ReplicaRouter().db_for_read(Profile)
+            return response
+        return ReplicaPinMiddleware(view)(request)
+
+    def test_reads_go_to_a_replica_unless_pinned(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Profile), 'replica_1')
+        self.assertEqual(ReplicaRouter().db_for_write(Profile), 'default')
+        with primary_reads():
+            self.assertEqual(ReplicaRouter().db_for_read(Profile), 'default')
+
+    def test_writers_read_their_writes(self):
+        factory = RequestFactory()
+        self.assertEqual(self.route(factory.get('/')).db, 'replica_1')
+        response = self.route(factory.post('/'))
+        self.assertEqual(response.db, 'default')
+        factory.cookies[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.route(factory.get('/')).db, 'default')
+
+
+@override_settings(SHARED_CACHE=True)
+class CachedViewerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.profile = make_profile('player')
+        self.backend = CachedModelBackend()
+
+    def test_user_and_profile_come_from_the_cache(self):
+        self.backend.get_user(self.profile.user_id)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.profile.user_id)
+            self.assertEqual(user.profile.display_name, 'player')
+
+    def test_changes_drop_the_cached_entry(self):
+        self.backend.get_user(self.profile.user_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.display_name = 'renamed'
+            self.profile.save()
+        self.assertEqual(self.backend.get_user(self.profile.user_id).profile.display_name, 'renamed')
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.profile.user_id)
+            user.is_active = False
+            user.save()
+        self.assertIsNone(self.backend.get_user(self.profile.user_id))
+
+    def test_password_change_still_ends_other_sessions(self):
+        self.client.force_login(self.profile.user)
+        self.assertTrue(self.client.get(reverse('home')).context['user'].is_authenticated)
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.profile.user_id)
+            user.set_password('a-new-passphrase-42')
+            user.save()
+        self.assertFalse(self.client.get(reverse('home')).context['user'].is_authenticated)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.member = make_profile('member')
+        self.guild = make_guild(self.member)
+        self.event = make_event(self.guild)
+        self.client.force_login(self.member.user)
+
+    def assertRevalidates(self, url, change):
+        # The first visit sets the CSRF cookie, which is part of the tag.
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_guild_page(self):
+        url = reverse('guild-detail', kwargs={'pk': self.guild.pk})
+        self.assertRevalidates(url, lambda: Membership.objects.create(guild=self.guild, profile=make_profile('applicant')))
+        self.assertRevalidates(url, lambda: Profile.objects.get(pk=self.member.pk).save())
+
+    def test_event_page(self):
+        url = reverse('event-detail', kwargs={'pk': self.event.pk})
+        self.assertRevalidates(url, lambda: RSVP.objects.create(event=self.event, profile=self.guild.owner, response='MAYBE'))
+
+    def test_profile_page(self):
+        url = reverse('profile-public', kwargs={'pk': self.member.pk})
+        other = Guild.objects.create(name='Other', owner=self.guild.owner)
+        self.assertRevalidates(url, lambda: Membership.objects.create(guild=other, profile=self.member))
+
+    @override_settings(SHARED_CACHE=True)
+    def test_guild_page_with_a_shared_cache(self):
+        cache.clear()
+        url = reverse('guild-detail', kwargs={'pk': self.guild.pk})
+        self.assertRevalidates(url, lambda: make_event(self.guild, title='Another raid'))
+
+    def test_tags_differ_per_viewer(self):
+        url = reverse('guild-detail', kwargs={'pk': self.guild.pk})
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.guild.owner.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
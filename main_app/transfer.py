@@ -0,0 +1,283 @@
+import csv
+import io
+import json
+import uuid
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import Membership, Event, RSVP, Profile
+from .tallies import recount_counters
+from .capacity import promote_waitlist
+from .caching import bump_guild_cache, bump_profile_cache
+from .live import schedule_rsvp_publish
+from .composition import parse_roles, resolve_roles
+
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+
+ROSTER_COLUMNS = ['username', 'display_name', 'role', 'status', 'joined_at']
+RSVP_COLUMNS = ['event_id', 'event_title', 'start_time', 'username', 'display_name', 'response', 'role_signed_up']
+EXPORT_KINDS = ('roster', 'rsvps')
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+def _roster_rows(guild):
+    rows = (
+        Membership.objects.filter(guild=guild)
+        .order_by('pk')
+        .values_list('profile__user__username', 'profile__display_name', 'role', 'status', 'joined_at')
+    )
+    for username, display_name, role, status, joined_at in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [username, display_name, role, status, joined_at.isoformat()]
+
+
+def _rsvp_rows(guild):
+    rows = (
+        RSVP.objects.filter(event__guild=guild)
+        .order_by('event__start_time', 'pk')
+        .values_list(
+            'event_id', 'event__title', 'event__start_time',
+            'profile__user__username', 'profile__display_name', 'response', 'role__name',
+        )
+    )
+    for event_id, title, start, username, display_name, response, role in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [str(event_id), title, start.isoformat(), username, display_name, response, role or '']
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_stream(guild, kind, fmt):
+    columns, rows = (ROSTER_COLUMNS, _roster_rows(guild)) if kind == 'roster' else (RSVP_COLUMNS, _rsvp_rows(guild))
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        encode = writer.writerow
+    else:
+        encode = lambda row: json.dumps(dict(zip(columns, row))) + '\n'
+    # Join rows into larger chunks so each yield is a reasonable write.
+    chunk = []
+    for row in rows:
+        chunk.append(encode(row))
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _garbled(text):
+    # U+FFFD is what undecodable bytes turn into below.
+    return '\ufffd' in text
+
+
+def read_rows(stream, fmt):
+    # Excel writes a BOM; any other encoding shows up as rows that fail to
+    # decode, which are reported rather than raised.
+    if isinstance(stream.read(0), bytes):
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    else:
+        text = stream
+    if fmt == 'csv':
+        for line_no, row in enumerate(csv.DictReader(text), start=2):
+            cells = [*row, *(v for v in row.values() if isinstance(v, str))]
+            yield line_no, None if any(_garbled(cell) for cell in cells if cell) else row
+    else:
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = None if _garbled(line) else json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, row if isinstance(row, dict) else None
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = []
+
+    def error(self, line_no, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line_no}: {message}')
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'skipped': self.skipped, 'errors': self.errors}
+
+
+def _batches(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _profiles_by_username(batch):
+    usernames = {str(row.get('username', '')).strip() for _, row in batch if row}
+    return {
+        p.user.username: p
+        for p in Profile.objects.filter(user__username__in=usernames).select_related('user').only('pk', 'user__username')
+    }
+
+
+def _event_id(row):
+    try:
+        return str(uuid.UUID(str(row.get('event_id', '')).strip()))
+    except ValueError:
+        return ''
+
+
+def import_roster(guild, rows, result):
+    roles = dict(Membership.ROLE_CHOICES)
+    statuses = dict(Membership.STATUS_CHOICES)
+    for batch in _batches(rows, IMPORT_BATCH_SIZE):
+        profiles = _profiles_by_username(batch)
+        valid = {}
+        for line_no, row in batch:
+            if row is None:
+                result.error(line_no, 'unreadable row (files must be UTF-8 CSV or JSON lines)')
+                continue
+            profile = profiles.get(str(row.get('username', '')).strip())
+            role = str(row.get('role') or 'MEMBER').upper()
+            status = str(row.get('status') or Membership.STATUS_APPROVED).upper()
+            if profile is None:
+                result.error(line_no, f"unknown user {row.get('username')!r}")
+            elif role not in roles:
+                result.error(line_no, f'invalid role {role!r}')
+            elif status not in statuses:
+                result.error(line_no, f'invalid status {status!r}')
+            else:
+                valid[profile.pk] = (role, status)
+
+        with transaction.atomic():
+            existing = {
+                m.profile_id: m
+                for m in Membership.objects.select_for_update().filter(guild=guild, profile_id__in=list(valid))
+            }
+            to_create, to_update = [], []
+            now = timezone.now()
+            for profile_id, (role, status) in valid.items():
+                membership = existing.get(profile_id)
+                if membership is None:
+                    to_create.append(Membership(guild=guild, profile_id=profile_id, role=role, status=status))
+                elif (membership.role, membership.status) != (role, status):
+                    membership.role, membership.status = role, status
+                    membership.updated_at = now
+                    to_update.append(membership)
+            Membership.objects.bulk_create(to_create, batch_size=IMPORT_BATCH_SIZE)
+            Membership.objects.bulk_update(to_update, ['role', 'status', 'updated_at'], batch_size=IMPORT_BATCH_SIZE)
+        result.created += len(to_create)
+        result.updated += len(to_update)
+        for profile_id in valid:
+            bump_profile_cache(profile_id)
+
+    bump_guild_cache(guild.pk)
+    return result
+
+
+def import_rsvps(guild, rows, result):
+    responses = dict(RSVP.RESPONSE_CHOICES)
+    for batch in _batches(rows, IMPORT_BATCH_SIZE):
+        profiles = _profiles_by_username(batch)
+        event_ids = {_event_id(row) for _, row in batch if row} - {''}
+        events = {str(pk) for pk in Event.objects.filter(guild=guild, pk__in=event_ids).values_list('pk', flat=True)}
+        role_names = {
+            line_no: next(iter(parse_roles(str(row.get('role_signed_up') or ''))), None)
+            for line_no, row in batch if row
+        }
+        roles = resolve_roles({name for name in role_names.values() if name})
+        # Only people who could RSVP themselves: approved members and the owner.
+        members = {guild.owner_id, *Membership.objects.filter(
+            guild=guild, status=Membership.STATUS_APPROVED, profile__in=[p.pk for p in profiles.values()],
+        ).values_list('profile_id', flat=True)}
+        valid = {}
+        for line_no, row in batch:
+            if row is None:
+                result.error(line_no, 'unreadable row (files must be UTF-8 CSV or JSON lines)')
+                continue
+            event_id = _event_id(row)
+            profile = profiles.get(str(row.get('username', '')).strip())
+            response = str(row.get('response') or '').upper()
+            role = roles.get(role_names[line_no])
+            if event_id not in events:
+                result.error(line_no, f"unknown event {row.get('event_id')!r} for this guild")
+            elif profile is None:
+                result.error(line_no, f"unknown user {row.get('username')!r}")
+            elif profile.pk not in members:
+                result.error(line_no, f"{row.get('username')!r} is not an approved member of this guild")
+            elif response not in responses:
+                result.error(line_no, f'invalid response {response!r}')
+            else:
+                valid[(event_id, profile.pk)] = (response, role)
+
+        with transaction.atomic():
+            # Lock the events first: their caps and counters decide who
+            # gets a seat.
+            events = {
+                str(e.pk): e
+                for e in Event.objects.select_for_update().filter(pk__in={e for e, _ in valid}).order_by('pk').only('pk', 'max_participants')
+            }
+            existing = {
+                (str(r.event_id), r.profile_id): r
+                for r in RSVP.objects.select_for_update().filter(
+                    event_id__in={e for e, _ in valid}, profile_id__in={p for _, p in valid}
+                )
+            }
+            to_create, to_update = [], []
+            # New YES answers on capped events join the waitlist, in file
+            # order behind anyone already waiting, and the promotion below
+            # seats them while there is room.
+            now = timezone.now()
+            for i, ((event_id, profile_id), (response, role)) in enumerate(valid.items()):
+                rsvp = existing.get((event_id, profile_id))
+                previous = rsvp.response if rsvp else None
+                if response == 'YES' and previous != 'YES' and events[event_id].max_participants is not None:
+                    response = RSVP.RESPONSE_WAITLIST
+                queued_at = now + timedelta(microseconds=i)
+                waiting = response == RSVP.RESPONSE_WAITLIST
+                if rsvp is None:
+                    to_create.append(RSVP(
+                        event_id=event_id, profile_id=profile_id, response=response, role=role,
+                        waitlisted_at=queued_at if waiting else None,
+                    ))
+                elif (rsvp.response, rsvp.role_id) != (response, role and role.pk):
+                    if waiting != (rsvp.response == RSVP.RESPONSE_WAITLIST):
+                        rsvp.waitlisted_at = queued_at if waiting else None
+                    rsvp.response, rsvp.role = response, role
+                    rsvp.updated_at = now
+                    to_update.append(rsvp)
+            RSVP.objects.bulk_create(to_create, batch_size=IMPORT_BATCH_SIZE)
+            RSVP.objects.bulk_update(to_update, ['response', 'role', 'waitlisted_at', 'updated_at'], batch_size=IMPORT_BATCH_SIZE)
+            # Bulk writes skip the rsvp view's counter shifts; recount the
+            # touched events under their row locks instead.
+            touched = list(events.values())
+            recount_counters(touched)
+            for event in touched:
+                if event.max_participants is not None:
+                    promote_waitlist(event.pk)
+                schedule_rsvp_publish(event.pk)
+        result.created += len(to_create)
+        result.updated += len(to_update)
+
+    bump_guild_cache(guild.pk)
+    return result
+
+
+def import_stream(guild, kind, fmt, stream):
+    result = ImportResult()
+    rows = read_rows(stream, fmt)
+    if kind == 'roster':
+        return import_roster(guild, rows, result)
+    return import_rsvps(guild, rows, result)
@@ -1,11 +1,18 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from . import views
 
+if settings.ASYNC_VIEWS:
+    guild_detail, event_detail, rsvp = views.guild_detail_async, views.event_detail_async, views.rsvp_async
+else:
+    guild_detail, event_detail, rsvp = views.GuildDetail.as_view(), views.EventDetail.as_view(), views.rsvp
+
 urlpatterns = [
     path('accounts/', include('django.contrib.auth.urls')),
     path('', views.Home.as_view(), name='home'),
+    path('perf/', views.perf_summary, name='perf-summary'),
+    path('search/<slug:kind>/autocomplete/', views.search_autocomplete, name='search-autocomplete'),
     path('accounts/signup/', views.signup, name='signup'),
 
     # Profile
@@ -13,28 +20,49 @@ urlpatterns = [
     path('profile/edit/', views.ProfileUpdate.as_view(), name='profile-edit'),
     path('profile/delete/', views.ProfileDelete.as_view(), name='profile-delete'),
     path('profile/avatar/remove/', views.remove_avatar, name='remove-avatar'),
+    path('profile/calendar/reset/', views.reset_calendar, name='calendar-reset'),
+    re_path(
+        r'^%s(?P<path>avatars/[0-9a-f]{2}/[0-9a-f]{64}(?:_\d+)?\.[a-z0-9]+)$' % settings.MEDIA_URL.lstrip('/'),
+        views.avatar_file,
+        name='avatar-file',
+    ),
+    path('profiles/search/', views.ProfileSearch.as_view(), name='profile-search'),
     path('profiles/<int:pk>/', views.ProfilePublicDetail.as_view(), name='profile-public'),
+    path('profiles/<int:pk>/calendar/<str:token>.ics', views.profile_calendar, name='profile-calendar'),
     path('profiles/external/<int:pk>/delete/', views.ExternalAccountDelete.as_view(), name='external-delete'),
 
     # Guild
     path('guilds/', views.GuildList.as_view(), name='guild-list'),
     path('guilds/create/', views.GuildCreate.as_view(), name='guild-create'),
-    path('guilds/<int:pk>/', views.GuildDetail.as_view(), name='guild-detail'),
+    path('guilds/<int:pk>/', guild_detail, name='guild-detail'),
+    path('guilds/<int:pk>/roster/', views.GuildRoster.as_view(), name='guild-roster'),
+    path('guilds/<int:pk>/calendar/<str:token>.ics', views.guild_calendar, name='guild-calendar'),
     path('guilds/<int:pk>/edit/', views.GuildUpdate.as_view(), name='guild-update'),
     path('guilds/<int:pk>/delete/', views.GuildDelete.as_view(), name='guild-delete'),
     path('guilds/<int:pk>/join/', views.guild_join, name='guild-join'),
     path('guilds/<int:pk>/leave/', views.guild_leave, name='guild-leave'),
+    path('guilds/<int:pk>/export/<slug:kind>.<slug:fmt>', views.guild_export, name='guild-export'),
+    path('guilds/<int:pk>/import/<slug:kind>/', views.guild_import, name='guild-import'),
+    path('guilds/<int:pk>/membership/bulk/', views.membership_bulk, name='membership-bulk'),
     path('guilds/<int:pk>/membership/<int:mid>/approve/', views.membership_approve, name='membership-approve'),
     path('guilds/<int:pk>/membership/<int:mid>/reject/', views.membership_reject, name='membership-reject'),
     path('guilds/<int:pk>/membership/<int:mid>/role/', views.membership_update_role, name='membership-update-role'),
 
     # Events
     path('guilds/<int:pk>/events/create/', views.EventCreate.as_view(), name='event-create'),
-    path('events/<uuid:pk>/', views.EventDetail.as_view(), name='event-detail'),
+    path('events/<uuid:pk>/', event_detail, name='event-detail'),
     path('events/<uuid:pk>/edit/', views.EventUpdate.as_view(), name='event-update'),
     path('events/<uuid:pk>/delete/', views.EventDelete.as_view(), name='event-delete'),
-    path('events/<uuid:pk>/rsvp/', views.rsvp, name='rsvp'),
+    path('events/<uuid:pk>/rsvp/', rsvp, name='rsvp'),
+    path('series/<int:pk>/<int:stamp>/', views.occurrence_detail, name='occurrence-detail'),
+    path('series/<int:pk>/<int:stamp>/rsvp/', views.occurrence_rsvp, name='occurrence-rsvp'),
+    path('series/<int:pk>/<int:stamp>/edit/', views.occurrence_edit, name='occurrence-edit'),
+    path('series/<int:pk>/<int:stamp>/delete/', views.occurrence_skip, name='occurrence-skip'),
 ]
+if settings.ASYNC_VIEWS:
+    # The stream holds its connection open for as long as the page is, which
+    # would tie up a whole sync worker; WSGI deployments keep plain reloads.
+    urlpatterns.append(path('events/<uuid:pk>/live/', views.event_live, name='event-live'))
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, 
@@ -1,18 +1,43 @@
 from django.contrib.auth.views import LoginView
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, Http404, StreamingHttpResponse, FileResponse, JsonResponse
 from django.forms import inlineformset_factory
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Case, When, Value, IntegerField
+from django.db import transaction
+from django.db.models import Case, When, Value, IntegerField, Count, Exists, OuterRef, Q
+from django.conf import settings
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.utils.decorators import method_decorator
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, View
-from .models import Profile, Guild, Membership, Event, EventTemplate, RSVP, ExternalAccount
+from .models import Profile, Guild, Membership, Event, EventSeries, EventTemplate, RSVP, ExternalAccount
 from .forms import ProfileForm, EventCreateForm, RSVPform, ExternalAccountForm
+from .recurrence import expand_window, materialize
+from .composition import fill_rates, slot_fill_rates
+from .tallies import tally_rsvps
+from .capacity import apply_response, promote_waitlist, waitlist_position
+from .permissions import guild_permissions
+from .pagination import keyset_paginate
+from .search import SEARCH_KINDS, SEARCH_PER_PAGE, search, autocomplete
+from .ical import feed_token, feed_token_profile, check_feed_token, feed_validators, ics_stream
+from .avatars import replace_avatar, release_avatar
+from .caching import FRAGMENT_TTL, guild_cache_version, bump_guild_cache, bump_profile_cache
+from .conditional import conditional_page, guild_validator, event_validator, profile_validator
+from .dashboard import dashboard_feed
+from .transfer import EXPORT_KINDS, EXPORT_FORMATS, export_stream, import_stream
+from .instrumentation import query_budget, view_stats
+from .asyncdb import parallel
+from .live import rsvp_stream
 
 
 ExternalAccountFormSet = inlineformset_factory(
@@ -25,17 +50,15 @@ ExternalAccountFormSet = inlineformset_factory(
 
 class Home(TemplateView):
     template_name = 'home.html'
+    query_budget = 6
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         user = self.request.user
         if user.is_authenticated:
-            profile = user.profile
-            ctx['my_guilds'] = profile.guilds.all()
-            now = timezone.now()
-            ctx['upcoming_events'] = Event.objects.filter(
-                guild__in = ctx['my_guilds'], start_time__gte = now
-            ).order_by('start_time')[:5]
+            feed = dashboard_feed(user.profile)
+            ctx['my_guilds'] = feed['guilds']
+            ctx['upcoming_events'] = feed['events']
         return ctx
 
 def signup(request):
@@ -45,7 +68,7 @@ def signup(request):
         if form.is_valid():
             user = form.save()
             Profile.objects.create(user=user, display_name=user.username)
-            login(request, user)
+            login(request, user, backend='main_app.backends.CachedModelBackend')
             return redirect('profile-detail')
         error = 'Invalid signup, please try again.'
     else:
@@ -60,6 +83,21 @@ class ProfileDetail(LoginRequiredMixin, DetailView):
     def get_object(self):
         return get_object_or_404(Profile, user=self.request.user)
 
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['calendar_url'] = self.request.build_absolute_uri(
+            reverse('profile-calendar', kwargs={'pk': self.object.pk, 'token': feed_token('profile', self.object.pk, self.object)})
+        )
+        return ctx
+
+@login_required
+def reset_calendar(request):
+    if request.method == 'POST':
+        profile = request.user.profile
+        profile.feed_version += 1
+        profile.save(update_fields=['feed_version', 'updated_at'])
+    return redirect('profile-detail')
+
 class ProfileUpdate(LoginRequiredMixin, UpdateView):
     model = Profile
     form_class = ProfileForm
@@ -80,7 +118,12 @@ class ProfileUpdate(LoginRequiredMixin, UpdateView):
         return ctx
 
     def form_valid(self, form):
+        avatar_changed = 'avatar' in form.changed_data
+        if avatar_changed:
+            old_avatar = Profile.objects.filter(pk=form.instance.pk).values_list('avatar', flat=True).first()
         self.object = form.save()
+        if avatar_changed:
+            replace_avatar(self.object, old_avatar)
         formset = self.get_context_data()['external_formset']
         if formset and formset.is_valid():
             formset.instance = self.object
@@ -104,10 +147,45 @@ class ProfileDelete(LoginRequiredMixin, DeleteView):
 
         return redirect(self.success_url)
     
+@method_decorator(conditional_page(profile_validator), name='get')
 class ProfilePublicDetail(LoginRequiredMixin, DetailView):
     model = Profile
     template_name = 'profiles/detail.html'
     context_object_name = 'profile'
+    query_budget = 8
+
+def page_number(request):
+    try:
+        return max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return 1
+
+class ProfileSearch(LoginRequiredMixin, ListView):
+    model = Profile
+    template_name = 'profiles/search.html'
+    context_object_name = 'profiles'
+    query_budget = 4
+    paginate_by = SEARCH_PER_PAGE
+
+    def paginate_queryset(self, queryset, page_size):
+        page = search('profiles', self.request.GET.get('q', ''), queryset, page=page_number(self.request), per_page=page_size)
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['query'] = self.request.GET.get('q', '').strip()
+        return ctx
+
+@login_required
+def search_autocomplete(request, kind):
+    if kind not in SEARCH_KINDS:
+        raise Http404
+    url_name = 'guild-detail' if kind == 'guilds' else 'profile-public'
+    results = [
+        {'id': pk, 'label': label, 'url': reverse(url_name, args=[pk])}
+        for pk, label in autocomplete(kind, request.GET.get('q', ''))
+    ]
+    return JsonResponse({'results': results})
 
 class ExternalAccountDelete(LoginRequiredMixin, View):
     def post(self, request, pk):
@@ -117,64 +195,136 @@ class ExternalAccountDelete(LoginRequiredMixin, View):
         acct.delete()
         return redirect('profile-detail')
     
+@staff_member_required
+def perf_summary(request):
+    return JsonResponse(view_stats.summary())
+
+def avatar_file(request, path):
+    storage = Profile._meta.get_field('avatar').storage
+    if not storage.exists(path):
+        raise Http404
+    response = FileResponse(storage.open(path, 'rb'))
+    # Names are content hashes, so a URL can never start serving different bytes.
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @login_required
 def remove_avatar(request):
     if request.method == 'POST':
         profile = request.user.profile
         if profile.avatar:
-            profile.avatar.delete(save=False)
+            release_avatar(profile.avatar.storage, profile.avatar.name)
         profile.avatar = None
-        profile.save()
+        # The profile may come from the viewer cache; write only this field.
+        profile.save(update_fields=['avatar', 'updated_at'])
     return redirect('profile-edit')
 
+ROSTER_PAGE_SIZE = 50
+ROSTER_KEYS = ['sort_order', 'profile__display_name', 'pk']
+
+def prioritized_members(guild):
+    return guild.membership_set.filter(status=Membership.STATUS_APPROVED).select_related('profile').annotate(
+        sort_order=Case(
+            When(role='LEADER',  then=Value(0)),
+            When(role='OFFICER', then=Value(1)),
+            When(role='MEMBER',  then=Value(2)),
+            When(role='RECRUIT', then=Value(3)),
+            When(role='TRIAL',   then=Value(4)),
+            default=Value(5),
+            output_field=IntegerField(),
+        )
+    )
+
 class GuildList(LoginRequiredMixin, ListView):
     model = Guild
     template_name = 'guilds/index.html'
     context_object_name = 'guilds'
+    query_budget = 6
+    paginate_by = 24
+
+    def get_queryset(self):
+        return Guild.objects.annotate(
+            member_count=Count('membership', filter=Q(membership__status=Membership.STATUS_APPROVED))
+        )
 
+    def paginate_queryset(self, queryset, page_size):
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            page = search('guilds', query, queryset, page=page_number(self.request), per_page=page_size)
+            return (None, page, page.object_list, page.has_other_pages())
+        page = keyset_paginate(
+            queryset, ['name'], page_size,
+            after=self.request.GET.get('after'),
+            before=self.request.GET.get('before'),
+        )
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['query'] = self.request.GET.get('q', '').strip()
+        ctx['joined_guild_ids'] = set(
+            Membership.objects.filter(profile=self.request.user.profile).values_list('guild_id', flat=True)
+        )
+        return ctx
+
+def guild_detail_context(request, guild, perms):
+    data = {}
+    today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Everything below the permission check is lazy: when the cached
+    # fragments are warm the template never touches it and no query runs.
+    data['upcoming_events'] = SimpleLazyObject(lambda: list(expand_window(guild.events, guild.series, today)))
+    data['member_counts'] = SimpleLazyObject(lambda: guild.membership_set.aggregate(
+        approved=Count('pk', filter=Q(status=Membership.STATUS_APPROVED)),
+        pending=Count('pk', filter=Q(status=Membership.STATUS_PENDING)),
+    ))
+    data['roster_page'] = SimpleLazyObject(
+        lambda: keyset_paginate(prioritized_members(guild), ROSTER_KEYS, ROSTER_PAGE_SIZE)
+    )
+    data['guild_perms'] = perms
+    if data['guild_perms'].is_owner or data['guild_perms'].is_member:
+        data['calendar_url'] = request.build_absolute_uri(
+            reverse('guild-calendar', kwargs={'pk': guild.pk, 'token': feed_token('guild', guild.pk, request.user.profile)})
+        )
+    if data['guild_perms'].can_manage_events:
+        data['pending_members'] = guild.membership_set.filter(
+            status=Membership.STATUS_PENDING
+        ).select_related('profile').order_by('joined_at')
+    data['role_choices'] = Membership.ROLE_CHOICES
+    data['guild_version'] = guild_cache_version(guild.pk)
+    data['fragment_ttl'] = FRAGMENT_TTL
+    data['today'] = today.date().isoformat()
+    return data
+
+@method_decorator(conditional_page(guild_validator), name='get')
 class GuildDetail(LoginRequiredMixin, DetailView):
     model = Guild
     template_name = 'guilds/detail.html'
     context_object_name = 'guild'
+    query_budget = 12
 
     def get_context_data(self, **kwargs):
         data = super().get_context_data(**kwargs)
-
-        today = timezone.localtime()
-        upcoming = self.object.events.filter(start_time__date__gte=today).order_by('start_time')
-        data['upcoming_events'] = upcoming
-        data['has_upcoming'] = upcoming.exists()
-
-        profile = self.request.user.profile
-        for event in upcoming:
-            event.count_yes = event.rsvps.filter(response='YES').count()
-            event.count_no = event.rsvps.filter(response='NO').count()
-            event.count_maybe = event.rsvps.filter(response='MAYBE').count()
-            event.rsvp_form = RSVPform(instance=RSVP.objects.filter(event=event, profile=profile).first())
-
-        base_qs = self.object.membership_set.filter(status=Membership.STATUS_APPROVED)
-        prioritized = base_qs.annotate(
-            sort_order=Case(
-                When(role='LEADER',  then=Value(0)),
-                When(role='OFFICER', then=Value(1)),
-                When(role='MEMBER',  then=Value(2)),
-                When(role='RECRUIT', then=Value(3)),
-                When(role='TRIAL',   then=Value(4)),
-                default=Value(5),
-                output_field=IntegerField(),
-            )
-        ).order_by('sort_order', 'profile__display_name')
-        data['approved_members'] = prioritized
-        data['pending_members'] = self.object.membership_set.filter(status=Membership.STATUS_PENDING)
-        data['is_approved'] = prioritized.filter(profile=profile).exists()
-        data['is_pending'] = data['pending_members'].filter(profile=profile).exists()
-
-        is_owner = (profile == self.object.owner)
-        is_officer = base_qs.filter(profile=profile, role__in=('LEADER', 'OFFICER')).exists()
-        data['can_manage_events'] = is_owner or is_officer
-        data['role_choices'] = Membership.ROLE_CHOICES
+        perms = guild_permissions(self.request, self.object)
+        data.update(guild_detail_context(self.request, self.object, perms))
         return data
 
+class GuildRoster(LoginRequiredMixin, DetailView):
+    model = Guild
+    template_name = 'guilds/roster.html'
+    context_object_name = 'guild'
+    query_budget = 6
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['roster_page'] = keyset_paginate(
+            prioritized_members(self.object), ROSTER_KEYS, ROSTER_PAGE_SIZE,
+            after=self.request.GET.get('after'),
+        )
+        ctx['guild_perms'] = guild_permissions(self.request, self.object)
+        ctx['role_choices'] = Membership.ROLE_CHOICES
+        return ctx
+
 class GuildCreate(LoginRequiredMixin, CreateView):
     model = Guild
     fields = ['name', 'description']
@@ -223,10 +373,7 @@ def guild_leave(request, pk):
 @login_required
 def membership_approve(request, pk, mid):
     guild = get_object_or_404(Guild, pk=pk)
-    profile = request.user.profile
-    is_owner = profile == guild.owner
-    is_officer = Membership.objects.filter(guild=guild, profile=profile, role='OFFICER').exists()
-    if request.method == 'POST' and (is_owner or is_officer):
+    if request.method == 'POST' and guild_permissions(request, guild).can_manage_events:
         memb = get_object_or_404(Membership, pk=mid, guild=guild, status=Membership.STATUS_PENDING)
         memb.status = Membership.STATUS_APPROVED
         memb.role = 'MEMBER'
@@ -236,23 +383,89 @@ def membership_approve(request, pk, mid):
 @login_required
 def membership_reject(request, pk, mid):
     guild = get_object_or_404(Guild, pk=pk)
-    profile = request.user.profile
-    is_owner = profile == guild.owner
-    is_officer = Membership.objects.filter(guild=guild, profile=profile, role='OFFICER').exists()
-    if request.method == 'POST' and (is_owner or is_officer):
+    if request.method == 'POST' and guild_permissions(request, guild).can_manage_events:
         Membership.objects.filter(pk=mid, guild=guild, status=Membership.STATUS_PENDING).delete()
     return redirect('guild-detail', pk=pk)
 
+@login_required
+def guild_export(request, pk, kind, fmt):
+    guild = get_object_or_404(Guild, pk=pk)
+    if not guild_permissions(request, guild).can_manage_events:
+        raise PermissionDenied('Only guild officers can export guild data.')
+    if kind not in EXPORT_KINDS or fmt not in EXPORT_FORMATS:
+        raise Http404
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_stream(guild, kind, fmt), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="guild-{guild.pk}-{kind}.{fmt}"'
+    return response
+
+@login_required
+def guild_import(request, pk, kind):
+    guild = get_object_or_404(Guild, pk=pk)
+    perms = guild_permissions(request, guild)
+    # Roster rows assign roles, which only the owner may do.
+    if not (perms.is_owner if kind == 'roster' else perms.can_manage_events):
+        raise PermissionDenied('You aren’t allowed to import into this guild.')
+    upload = request.FILES.get('file')
+    if request.method != 'POST' or kind not in EXPORT_KINDS or upload is None:
+        return JsonResponse({'error': 'POST a file field with CSV or JSONL rows.'}, status=400)
+    fmt = request.POST.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+    if fmt not in EXPORT_FORMATS:
+        return JsonResponse({'error': f'Unsupported format {fmt!r}.'}, status=400)
+    return JsonResponse(import_stream(guild, kind, fmt, upload).as_dict())
+
+BULK_ACTIONS = ('approve', 'reject', 'role')
+
+@login_required
+@query_budget(12)
+def membership_bulk(request, pk):
+    guild = get_object_or_404(Guild, pk=pk)
+    perms = guild_permissions(request, guild)
+    action = request.POST.get('action')
+    if request.method != 'POST' or action not in BULK_ACTIONS:
+        return redirect('guild-detail', pk=pk)
+    if not (perms.is_owner if action == 'role' else perms.can_manage_events):
+        raise PermissionDenied('You aren’t allowed to manage this guild’s members.')
+
+    status = Membership.STATUS_APPROVED if action == 'role' else Membership.STATUS_PENDING
+    targets = Membership.objects.filter(guild=guild, status=status)
+    if request.POST.get('all') != '1':
+        ids = [mid for mid in request.POST.getlist('mids') if mid.isdigit()]
+        targets = targets.filter(pk__in=ids)
+    new_role = request.POST.get('role')
+    if action == 'role':
+        if new_role not in dict(Membership.ROLE_CHOICES):
+            return redirect('guild-detail', pk=pk)
+        # The owner's own row keeps its role; demoting yourself in bulk is never intended.
+        targets = targets.exclude(profile_id=guild.owner_id)
+
+    with transaction.atomic():
+        rows = list(targets.select_for_update().values_list('pk', 'profile_id'))
+        if rows:
+            affected = Membership.objects.filter(pk__in=[mid for mid, _ in rows])
+            if action == 'approve':
+                affected.update(status=Membership.STATUS_APPROVED, role='MEMBER', updated_at=timezone.now())
+            elif action == 'reject':
+                affected.delete()
+            else:
+                affected.update(role=new_role, updated_at=timezone.now())
+    # update() skips post_save, so invalidate the same caches the signals would.
+    if rows and action != 'reject':
+        bump_guild_cache(guild.pk)
+        for _, profile_id in rows:
+            bump_profile_cache(profile_id)
+    return redirect('guild-detail', pk=pk)
+
+@login_required
 def membership_update_role(request, pk, mid):
     guild = get_object_or_404(Guild, pk=pk)
-    profile = request.user.profile
-    if request.method == 'POST' and profile == guild.owner:
+    if request.method == 'POST' and guild_permissions(request, guild).is_owner:
         m = get_object_or_404(Membership, pk=mid, guild=guild, status='APPROVED')
         new_role = request.POST.get('role')
         if new_role in dict(Membership.ROLE_CHOICES):
             m.role = new_role
             m.save()
-        return redirect('guild-detail', pk=pk)
+    return redirect('guild-detail', pk=pk)
 
 class EventCreate(LoginRequiredMixin, CreateView):
     model = Event
@@ -261,14 +474,7 @@ class EventCreate(LoginRequiredMixin, CreateView):
 
     def dispatch(self, request, *args, **kwargs):
         self.guild = get_object_or_404(Guild, pk=kwargs['pk'])
-        profile = request.user.profile
-        is_owner = (profile == self.guild.owner)
-        is_member = Membership.objects.filter(
-            guild = self.guild,
-            profile = request.user.profile,
-            status = Membership.STATUS_APPROVED
-        ).exists()
-        if not (is_owner or is_member):
+        if not guild_permissions(request, self.guild).can_schedule_events:
             raise PermissionDenied('You must be a guild member to schedule events.')
         return super().dispatch(request, *args, **kwargs)
     
@@ -289,7 +495,24 @@ class EventCreate(LoginRequiredMixin, CreateView):
             form.instance.required_roles = tpl.default_roles
         event = form.save(commit=False)
         event.guild = self.guild
-        event.save()
+        if form.cleaned_data.get('repeat'):
+            # Occurrences are expanded on demand; rows only appear once
+            # someone RSVPs to or edits one.
+            EventSeries.objects.create(
+                guild=self.guild,
+                template=tpl,
+                title=event.title,
+                description=event.description,
+                required_roles=event.required_roles,
+                max_participants=event.max_participants,
+                starts_at=event.start_time,
+                duration=event.end_time - event.start_time,
+                interval=form.cleaned_data['repeat'],
+                weekdays=','.join(form.cleaned_data['repeat_days']),
+                until=form.cleaned_data.get('repeat_until'),
+            )
+        else:
+            event.save()
         if form.cleaned_data.get('save_as_template'):
             EventTemplate.objects.create(
                 guild=self.guild,
@@ -307,25 +530,34 @@ class EventUpdate(LoginRequiredMixin, UpdateView):
     def dispatch(self, request, *args, **kwargs):
         self.event = self.get_object()
         self.guild = self.event.guild
-        profile = request.user.profile
-        is_owner = (profile == self.guild.owner)
-        is_officer = Membership.objects.filter(
-            guild=self.guild,
-            profile=profile,
-            role__in=('LEADER','OFFICER'),
-            status=Membership.STATUS_APPROVED
-        ).exists()
-        if not (is_owner or is_officer):
+        if not guild_permissions(request, self.guild).can_manage_events:
             raise PermissionDenied('You aren’t allowed to edit this event.')
         return super().dispatch(request, *args, **kwargs)
+
+    def get_object(self, queryset=None):
+        if not hasattr(self, 'event'):
+            self.event = super().get_object(queryset)
+        return self.event
     
+    def get_queryset(self):
+        return Event.objects.select_related('guild')
+
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        for name in ('repeat', 'repeat_days', 'repeat_until'):
+            form.fields.pop(name)
+        return form
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx['guild'] = self.guild
         return ctx
 
     def form_valid(self, form):
-        event = form.save()
+        with transaction.atomic():
+            event = form.save()
+            if 'max_participants' in form.changed_data:
+                promote_waitlist(event.pk)
         if form.cleaned_data.get('save_as_template'):
             EventTemplate.objects.update_or_create(
                 guild=self.guild,
@@ -342,72 +574,269 @@ class EventDelete(LoginRequiredMixin, DeleteView):
     template_name = 'events/confirm_delete.html'
 
     def dispatch(self, request, *args, **kwargs):
-        event = self.get_object()
-        guild = event.guild
-        profile = request.user.profile
-        is_owner = (profile == guild.owner)
-        is_officer = Membership.objects.filter(
-            guild=guild,
-            profile=profile,
-            role__in=('LEADER','OFFICER'),
-            status=Membership.STATUS_APPROVED
-        ).exists()
-        if not (is_owner or is_officer):
+        self.event = self.get_object()
+        if not guild_permissions(request, self.event.guild).can_manage_events:
             raise PermissionDenied('You aren’t allowed to edit this event.')
         return super().dispatch(request, *args, **kwargs)
+
+    def get_object(self, queryset=None):
+        if not hasattr(self, 'event'):
+            self.event = super().get_object(queryset)
+        return self.event
+
+    def get_queryset(self):
+        return Event.objects.select_related('guild')
     
     def post(self, request, *args, **kwargs):
         event = self.get_object()
         guild_pk = event.guild.pk
-        event.delete()
+        with transaction.atomic():
+            if event.series_id:
+                event.series.skip(event.occurrence_start)
+            event.delete()
         return redirect('guild-detail', pk=guild_pk)
 
+def event_detail_context(event, perms, composition):
+    ctx = {
+        'waitlist_position': getattr(event.my_rsvp, 'waitlist_position', None),
+        'count_yes': event.count_yes,
+        'count_no': event.count_no,
+        'count_maybe': event.count_maybe,
+        'my_response': event.my_rsvp.response if event.my_rsvp else None,
+        'my_role': event.my_rsvp.role.name if event.my_rsvp and event.my_rsvp.role_id else None,
+        'composition': composition,
+        'guild_perms': perms,
+    }
+    # The live stream holds its connection open, which only an ASGI worker
+    # can afford; sync deployments keep plain page loads.
+    if settings.ASYNC_VIEWS and not event.is_virtual:
+        ctx['live_url'] = reverse('event-live', args=[event.pk])
+    return ctx
+
+@method_decorator(conditional_page(event_validator), name='get')
 class EventDetail(LoginRequiredMixin, DetailView):
     model = Event
     template_name = 'events/detail.html'
     context_object_name = 'event'
+    query_budget = 8
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         event = self.object
-        ctx['count_yes'] = event.rsvps.filter(response='YES').count()
-        ctx['count_no'] = event.rsvps.filter(response='NO').count()
-        ctx['count_maybe'] = event.rsvps.filter(response='MAYBE').count()
-        my_rsvp = RSVP.objects.filter(event=event, profile=self.request.user.profile).first()
-        ctx['my_response'] = my_rsvp.response if my_rsvp else None
-        guild = event.guild
-        profile = self.request.user.profile
-        is_owner   = (profile == guild.owner)
-        is_officer = Membership.objects.filter(
-            guild=guild, profile=profile,
-            role__in=('LEADER','OFFICER'),
-            status=Membership.STATUS_APPROVED
-        ).exists()
-        ctx['can_manage_events'] = is_owner or is_officer
+        tally_rsvps([event], self.request.user.profile)
+        if event.my_rsvp is not None:
+            event.my_rsvp.waitlist_position = waitlist_position(event.my_rsvp)
+        composition = fill_rates([event])[event.pk]
+        ctx.update(event_detail_context(event, guild_permissions(self.request, event.guild), composition))
         return ctx
 
+    def get_queryset(self):
+        return Event.objects.select_related('guild')
+
 @login_required
+@query_budget(15)
 def rsvp(request, pk):
-    event = get_object_or_404(Event, pk=pk)
+    event = get_object_or_404(Event.objects.select_related('guild'), pk=pk)
     profile = request.user.profile
-    guild = event.guild
-    is_owner = profile == guild.owner
-    is_officer = Membership.objects.filter(
-            guild=guild,
-            profile=profile,
-            role__in=('LEADER','OFFICER'),
-            status=Membership.STATUS_APPROVED
-        ).exists()
-    is_member = Membership.objects.filter(
-            guild=guild,
-            profile=profile,
-            status=Membership.STATUS_APPROVED
-        ).exists()
-    if not (is_owner or is_officer or is_member):
+    perms = guild_permissions(request, event.guild)
+    if not (perms.is_owner or perms.is_member):
         raise PermissionDenied('Only Guild Members can RSVP')
-    rsvp, _ = RSVP.objects.get_or_create(event=event, profile=profile)
-    if request.method == 'POST': 
-        form = RSVPform(request.POST, instance=rsvp)
-        if form.is_valid():
-            form.save()
-    return redirect ('event-detail', pk=event.pk)
\ No newline at end of file
+    save_rsvp(request, event, profile)
+    return redirect ('event-detail', pk=event.pk)
+
+def save_rsvp(request, event, profile):
+    with transaction.atomic():
+        # The event's lock comes before any RSVP row's (see promote_waitlist).
+        Event.objects.select_for_update().only('pk').get(pk=event.pk)
+        rsvp, _ = RSVP.objects.select_for_update().get_or_create(event=event, profile=profile)
+        previous = rsvp.response
+        if request.method == 'POST':
+            form = RSVPform(request.POST, instance=rsvp)
+            if form.is_valid():
+                apply_response(rsvp, previous)
+
+def get_occurrence(pk, stamp):
+    series = get_object_or_404(EventSeries.objects.select_related('guild'), pk=pk)
+    start = series.occurrence_at(stamp)
+    if start is None:
+        raise Http404
+    return series, start
+
+@login_required
+def occurrence_detail(request, pk, stamp):
+    series, start = get_occurrence(pk, stamp)
+    existing = Event.objects.filter(series=series, occurrence_start=start).values_list('pk', flat=True).first()
+    if existing:
+        return redirect('event-detail', pk=existing)
+    event = series.build_occurrence(start)
+    event.my_rsvp = None
+    composition = fill_rates([event])[event.pk]
+    ctx = {'event': event, **event_detail_context(event, guild_permissions(request, series.guild), composition)}
+    return render(request, 'events/detail.html', ctx)
+
+@login_required
+def occurrence_rsvp(request, pk, stamp):
+    series, start = get_occurrence(pk, stamp)
+    perms = guild_permissions(request, series.guild)
+    if not (perms.is_owner or perms.is_member):
+        raise PermissionDenied('Only Guild Members can RSVP')
+    return rsvp(request, materialize(series, start).pk)
+
+@login_required
+def occurrence_edit(request, pk, stamp):
+    series, start = get_occurrence(pk, stamp)
+    if not guild_permissions(request, series.guild).can_manage_events:
+        raise PermissionDenied('You aren’t allowed to edit this event.')
+    return redirect('event-update', pk=materialize(series, start).pk)
+
+@login_required
+def occurrence_skip(request, pk, stamp):
+    series, start = get_occurrence(pk, stamp)
+    if not guild_permissions(request, series.guild).can_manage_events:
+        raise PermissionDenied('You aren’t allowed to edit this event.')
+    if request.method != 'POST':
+        event = series.build_occurrence(start)
+        return render(request, 'events/confirm_delete.html', {'event': event, 'object': event})
+    with transaction.atomic():
+        series.skip(start)
+        Event.objects.filter(series=series, occurrence_start=start).delete()
+    return redirect('guild-detail', pk=series.guild_id)
+
+FEED_HISTORY = timedelta(days=30)
+
+def calendar_feed(request, events, series, name_for):
+    since = timezone.now() - FEED_HISTORY
+    events = events.upcoming(since)
+    series = series.filter(Q(until__isnull=True) | Q(until__gte=since)).order_by('pk')
+    etag, last_modified = feed_validators(events, series)
+    if etag:
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified.timestamp())
+        if not_modified:
+            return not_modified
+    response = StreamingHttpResponse(
+        ics_stream(
+            events.only('pk', 'title', 'description', 'start_time', 'end_time', 'updated_at', 'series_id', 'occurrence_start'),
+            series,
+            name_for(),
+            request.build_absolute_uri,
+        ),
+        content_type='text/calendar; charset=utf-8',
+    )
+    if etag:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+def feed_subscriber(kind, pk, token, profiles):
+    # The profile the feed was issued to, if it is among profiles (those
+    # who may still see it) and the token is current.
+    profile_pk = feed_token_profile(token)
+    profile = None if profile_pk is None else profiles.filter(pk=profile_pk).only('feed_version').first()
+    if profile is None or not check_feed_token(kind, pk, token, profile):
+        raise Http404
+    return profile
+
+def guild_calendar(request, pk, token):
+    feed_subscriber('guild', pk, token, Profile.objects.filter(
+        Exists(Guild.objects.filter(pk=pk, owner=OuterRef('pk')))
+        | Exists(Membership.objects.filter(guild_id=pk, profile=OuterRef('pk'), status=Membership.STATUS_APPROVED))
+    ))
+    return calendar_feed(
+        request,
+        Event.objects.filter(guild_id=pk),
+        EventSeries.objects.filter(guild_id=pk),
+        lambda: get_object_or_404(Guild, pk=pk).name,
+    )
+
+def profile_calendar(request, pk, token):
+    feed_subscriber('profile', pk, token, Profile.objects.filter(pk=pk))
+    guilds = Guild.objects.filter(
+        Q(owner_id=pk) | Q(membership__profile_id=pk, membership__status=Membership.STATUS_APPROVED)
+    ).values('pk')
+    return calendar_feed(
+        request,
+        Event.objects.filter(guild__in=guilds),
+        EventSeries.objects.filter(guild__in=guilds),
+        lambda: f'{get_object_or_404(Profile, pk=pk).display_name} · Super Sweat',
+    )
+
+# Async versions of the hot paths, routed instead of the sync ones when
+# settings.ASYNC_VIEWS is on and the site is served over ASGI.
+
+async def load_viewer(request, *extra):
+    request.user = user = await request.auser()
+    extra = [(lambda fn=fn: fn(user)) for fn in extra]
+    # The auth backend usually hands the profile over with the user.
+    if type(user).profile.is_cached(user):
+        return user.profile, await parallel(*extra)
+    profile, *rest = await parallel(lambda: Profile.objects.get(user=user), *extra)
+    user.profile = profile
+    return profile, rest
+
+def load_my_rsvp(event_id, user):
+    rsvp = RSVP.objects.filter(event_id=event_id, profile__user=user).select_related('role').first()
+    if rsvp is not None:
+        rsvp.waitlist_position = waitlist_position(rsvp)
+    return rsvp
+
+@login_required
+@query_budget(8)
+@conditional_page(event_validator)
+async def event_detail_async(request, pk):
+    profile, (event, membership, my_rsvp, composition) = await load_viewer(
+        request,
+        lambda user: Event.objects.select_related('guild').filter(pk=pk).first(),
+        lambda user: Membership.objects.filter(guild__events=pk, profile__user=user).first(),
+        lambda user: load_my_rsvp(pk, user),
+        lambda user: slot_fill_rates([pk])[pk],
+    )
+    if event is None:
+        raise Http404
+    event.my_rsvp = my_rsvp
+    perms = guild_permissions(request, event.guild, profile).prime(membership)
+    ctx = {'event': event, 'object': event, **event_detail_context(event, perms, composition)}
+    return await sync_to_async(render)(request, 'events/detail.html', ctx)
+
+@login_required
+@query_budget(12)
+@conditional_page(guild_validator)
+async def guild_detail_async(request, pk):
+    profile, (guild, membership) = await load_viewer(
+        request,
+        lambda user: Guild.objects.filter(pk=pk).first(),
+        lambda user: Membership.objects.filter(guild_id=pk, profile__user=user).first(),
+    )
+    if guild is None:
+        raise Http404
+    perms = guild_permissions(request, guild, profile).prime(membership)
+
+    def respond():
+        ctx = {'guild': guild, 'object': guild, **guild_detail_context(request, guild, perms)}
+        return render(request, 'guilds/detail.html', ctx)
+    return await sync_to_async(respond)()
+
+@login_required
+@query_budget(15)
+async def rsvp_async(request, pk):
+    profile, (event, membership) = await load_viewer(
+        request,
+        lambda user: Event.objects.select_related('guild').filter(pk=pk).first(),
+        lambda user: Membership.objects.filter(guild__events=pk, profile__user=user).first(),
+    )
+    if event is None:
+        raise Http404
+    perms = guild_permissions(request, event.guild, profile).prime(membership)
+    if not (perms.is_owner or perms.is_member):
+        raise PermissionDenied('Only Guild Members can RSVP')
+    await sync_to_async(save_rsvp)(request, event, profile)
+    return redirect('event-detail', pk=event.pk)
+
+@login_required
+async def event_live(request, pk):
+    if not await Event.objects.filter(pk=pk).aexists():
+        raise Http404
+    response = StreamingHttpResponse(rsvp_stream(pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
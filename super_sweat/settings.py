@@ -10,12 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 #Newly added to process a .env's secrets...
 import os
 import environ
-environ.Env()
+env = environ.Env()
 environ.Env.read_env()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,10 +45,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'main_app.instrumentation.PerformanceMiddleware',
+    'main_app.routers.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,7 +64,8 @@ ROOT_URLCONF = 'super_sweat.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing each render for PerformanceMiddleware.
+        'BACKEND': 'main_app.instrumentation.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -90,6 +95,86 @@ DATABASES = {
     }
 }
 
+# Read replicas, e.g. DATABASE_REPLICA_URLS=postgres://u:p@replica-1/super-sweat
+# Safe reads are spread across them (main_app.routers.ReplicaRouter); writes,
+# and a client's requests for REPLICA_PIN_SECONDS after it POSTs, stay on
+# default. Tests mirror default, so pointing a replica at the same SQLite
+# file also works for trying the routing out locally.
+DATABASE_REPLICAS = []
+for i, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), 1):
+    DATABASES[f'replica_{i}'] = {**env.db_url_config(url), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{i}')
+DATABASE_ROUTERS = ['main_app.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = env.int('REPLICA_PIN_SECONDS', default=5)
+
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+# Invalidating through the cache (fragment versions, cached sessions and
+# users) only reaches the other workers when they share it, so point
+# CACHE_URL at Redis or memcached in production. The per-process default
+# is for development; the features that rely on a shared cache fall back
+# to the database or to short TTLs without one.
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Guild page fragments are keyed on a version that every write bumps. A
+# per-process cache only sees its own worker's bumps, so there the TTL
+# bounds how stale another worker's copy can get.
+GUILD_FRAGMENT_TTL = 60 * 60 if SHARED_CACHE else 60
+
+# Per-view query budgets (see main_app.instrumentation) fail the request
+# under `manage.py test` and only log a warning everywhere else.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+QUERY_BUDGET_RAISE = TESTING
+PERF_HEADERS = DEBUG
+
+# Route the hot read/RSVP paths to their async views. Only worth turning on
+# when serving super_sweat.asgi, e.g.
+#   gunicorn super_sweat.asgi:application -k uvicorn_worker.UvicornWorker
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
+# Connection reuse, per worker process. DB_POOL_MAX_SIZE turns on psycopg 3's
+# pool (install psycopg[pool] in place of psycopg2-binary), capped at that
+# many connections per process, so workers x DB_POOL_MAX_SIZE must fit in
+# Postgres' max_connections. Without it each thread keeps its connection for
+# DB_CONN_MAX_AGE seconds, checked before reuse. ASGI workers run views on
+# throwaway threads, so there persistent connections default to off; use
+# the pool instead. `manage.py bench_connections` compares the modes.
+DB_POOL_MAX_SIZE = env.int('DB_POOL_MAX_SIZE', default=0)
+for db in DATABASES.values():
+    if DB_POOL_MAX_SIZE and db['ENGINE'] == 'django.db.backends.postgresql':
+        db['CONN_MAX_AGE'] = 0
+        db.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': env.float('DB_POOL_TIMEOUT', default=10),
+        }
+    else:
+        db['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=0 if ASYNC_VIEWS else 60)
+        db['CONN_HEALTH_CHECKS'] = True
+
+# Pub/sub behind the live RSVP stream. LocalBroker only reaches viewers in
+# the same process; use main_app.live.PostgresBroker with several workers.
+LIVE_BROKER = env('LIVE_BROKER', default='main_app.live.LocalBroker')
+
+
+# With a shared cache, sessions are read from it and only fall back to the
+# database on a miss; the user and profile behind them come from the cache
+# too (main_app.backends). ModelBackend stays listed so sessions created
+# before the switch keep working.
+SESSION_ENGINE = env('SESSION_ENGINE', default=(
+    'django.contrib.sessions.backends.cached_db' if SHARED_CACHE else 'django.contrib.sessions.backends.db'
+))
+AUTHENTICATION_BACKENDS = [
+    'main_app.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+VIEWER_CACHE_TTL = 15 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators